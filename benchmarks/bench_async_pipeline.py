@@ -0,0 +1,72 @@
+# Wall-clock time of the sequential catalogue load versus the asyncio pipeline.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_async_pipeline bakery --rows 50000 --latency 0.2
+#
+# A synthetic copy of the dataset (benchmarks/synthetic.py) is loaded into
+# fresh SQLite staging files twice: once by prepare_dataset + load_tables,
+# where every table is parsed and checked before anything is sent, and once
+# by pipeline_load, where parsing, checking and inserts overlap. ``--latency``
+# adds a sleep to every round-trip to stand in for the network link to
+# Azure SQL, which is where the overlap pays off. Without it the local load
+# is bound by Python's row conversion and SQLite's single writer, and the
+# two loaders take about as long.
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from loaders.async_pipeline import pipeline_load
+from loaders.catalogue import load_dataset
+from loaders.targets import sqlite_engine
+
+from benchmarks.synthetic import generate
+
+
+def with_latency(engine, seconds):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def delay(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            time.sleep(seconds)
+    return engine
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('dataset', nargs='?', default='bakery')
+    parser.add_argument('--rows', type=int, default=50000, help="rows in the largest table")
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds added to each insert batch")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunksize', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        specs = generate(args.dataset, args.rows, os.path.join(directory, 'csv'))
+        sequential = with_latency(sqlite_engine(os.path.join(directory, 'sequential.db')), args.latency)
+        pipelined = with_latency(sqlite_engine(os.path.join(directory, 'pipeline.db')), args.latency)
+        results = [
+            ('sequential', timed(lambda: load_dataset(args.dataset, sequential, specs, cache=False,
+                                                      max_workers=args.workers))),
+            ('pipeline', timed(lambda: pipeline_load(specs, pipelined, args.workers, args.chunksize,
+                                                     batch_size=args.batch_size))),
+        ]
+        sequential.dispose()
+        pipelined.dispose()
+
+    print(f"{'loader':<12}{'seconds':>10}")
+    for label, seconds in results:
+        print(f"{label:<12}{seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
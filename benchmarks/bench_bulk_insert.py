@@ -0,0 +1,98 @@
+# Rows/second of the per-row ORM upload versus the executemany bulk loader.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_bulk_insert --scale 200
+#
+# The students and teachers CSVs are repeated ``--scale`` times (with fresh
+# keys) and loaded into the local example.db SQLite file. The benchmark
+# tables are dropped again after every run, so example.db is left as found.
+
+import argparse
+import time
+
+import pandas
+from sqlalchemy.orm import sessionmaker
+
+from loaders.models import Base, Student, Teacher, STUDENT_COLUMNS, TEACHER_COLUMNS
+from loaders.bulk_loader import bulk_insert
+from loaders.connection import get_engine
+
+TABLES = [Teacher.__table__, Student.__table__]
+
+
+def scaled_frames(scale):
+    students_df = pandas.read_csv('dbs/students/students.csv')
+    teachers_df = pandas.read_csv('dbs/students/teachers.csv')
+    student_copies, teacher_copies = [], []
+    for copy in range(scale):
+        students = students_df.copy()
+        students['ID'] += copy * len(students_df)
+        students['Classroom_ID'] += copy * 1000
+        teachers = teachers_df.copy()
+        teachers['Classroom_ID'] += copy * 1000
+        student_copies.append(students)
+        teacher_copies.append(teachers)
+    return (pandas.concat(student_copies, ignore_index=True),
+            pandas.concat(teacher_copies, ignore_index=True))
+
+
+def orm_load(engine, students_df, teachers_df):
+    # The original Step 8: one ORM object per row, one commit at the end
+    session = sessionmaker(bind=engine)()
+    for index, row in teachers_df.iterrows():
+        session.add(Teacher(
+            classroom_id=row['Classroom_ID'],
+            last_name=row['LastName'],
+            first_name=row['FirstName']
+        ))
+    for index, row in students_df.iterrows():
+        session.add(Student(
+            id=row['ID'],
+            last_name=row['LastName'],
+            first_name=row['FirstName'],
+            grade=row['Grade'],
+            classroom_id=row['Classroom_ID']
+        ))
+    session.commit()
+    session.close()
+
+
+def bulk_load(engine, students_df, teachers_df):
+    with engine.begin() as connection:
+        bulk_insert(teachers_df, Teacher, connection, columns=TEACHER_COLUMNS)
+        bulk_insert(students_df, Student, connection, columns=STUDENT_COLUMNS)
+
+
+def run(engine, loader, students_df, teachers_df):
+    Base.metadata.drop_all(engine, tables=TABLES)
+    Base.metadata.create_all(engine, tables=TABLES)
+    try:
+        start = time.perf_counter()
+        loader(engine, students_df, teachers_df)
+        return time.perf_counter() - start
+    finally:
+        Base.metadata.drop_all(engine, tables=TABLES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='example.db', help='SQLite file to load into')
+    parser.add_argument('--scale', type=int, default=100, help='copies of the students dataset')
+    args = parser.parse_args()
+
+    students_df, teachers_df = scaled_frames(args.scale)
+    rows = len(students_df) + len(teachers_df)
+    engine = get_engine(f'sqlite:///{args.db}')
+
+    print(f"Loading {rows} rows into {args.db}")
+    results = {}
+    for name, loader in [('orm', orm_load), ('bulk', bulk_load)]:
+        elapsed = run(engine, loader, students_df, teachers_df)
+        results[name] = elapsed
+        print(f"{name:>5}: {elapsed:8.3f} s  {rows / elapsed:12,.0f} rows/s")
+    print(f"speed-up: {results['orm'] / results['bulk']:.1f}x")
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
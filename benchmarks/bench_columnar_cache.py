@@ -0,0 +1,64 @@
+# Cold CSV ingestion versus warm reload from the columnar cache, per dataset.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_columnar_cache --scale 500
+#
+# Every CSV of a dataset is repeated ``--scale`` times into a temporary
+# directory. "cold" reads and coerces each table the way the catalogue does
+# on a first run (read_dbs_csv, then the spec's date and decimal coercion);
+# "warm" memory-maps the Arrow files written from those frames. Times are
+# the best of ``--repeat`` runs and cover every table of the dataset.
+
+import argparse
+import os
+import tempfile
+import time
+
+from loaders import columnar_cache
+from loaders.catalogue import DATASETS, coerce
+from loaders.csv_dialect import read_dbs_csv
+
+from benchmarks.bench_csv_dialect import scaled_copy
+
+
+def best_of(repeat, run):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=100, help='copies of each file body')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per path')
+    args = parser.parse_args()
+    if not columnar_cache.available():
+        parser.error("the columnar cache needs pyarrow")
+
+    print(f"{'dataset':<16}{'rows':>10}{'cold (ms)':>12}{'warm (ms)':>12}{'speed-up':>10}{'cache (MB)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, specs in DATASETS.items():
+            specs = [spec._replace(file=scaled_copy(spec.file, args.scale, directory)) for spec in specs]
+            paths = [os.path.join(directory, f'{name}-{number}.arrow') for number in range(len(specs))]
+
+            def cold():
+                return [coerce(read_dbs_csv(spec.file), spec)[0] for spec in specs]
+
+            def warm():
+                return [columnar_cache.read_cached(path) for path in paths]
+
+            frames = cold()
+            for frame, path in zip(frames, paths):
+                columnar_cache.write_cached(frame, path)
+            cold_time, warm_time = best_of(args.repeat, cold), best_of(args.repeat, warm)
+            rows = sum(len(frame) for frame in frames)
+            size = sum(os.path.getsize(path) for path in paths)
+            print(f"{name:<16}{rows:>10}{cold_time * 1000:>12.1f}{warm_time * 1000:>12.1f}"
+                  f"{cold_time / warm_time:>9.1f}x{size / 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
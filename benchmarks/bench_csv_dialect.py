@@ -0,0 +1,82 @@
+# Parse speed and memory of read_dbs_csv versus read_csv followed by cleaning.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_csv_dialect --scale 500
+#
+# Every CSV of the five datasets is repeated ``--scale`` times into a
+# temporary file, then parsed both ways. Times are the best of ``--repeat``
+# runs; "peak" is the Python heap peak (tracemalloc) while parsing, which
+# does not see Arrow-backed string buffers, and "frame" is the deep memory
+# usage of the resulting DataFrame.
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas
+
+from loaders.csv_dialect import read_dbs_csv
+
+DATASETS = ['airlines', 'bakery', 'reservations', 'students', 'wine']
+
+
+def read_then_clean(path):
+    # The path used by the setup scripts: a default read_csv, then strip the
+    # header, padding and quotes column by column in Python
+    frame = pandas.read_csv(path)
+    frame = frame.rename(columns=str.strip)
+    for column in frame.columns:
+        if not pandas.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = frame[column].str.strip().str.strip("'").str.strip()
+    return frame
+
+
+def scaled_copy(path, scale, directory):
+    with open(path) as handle:
+        header, body = handle.readline(), handle.read()
+    if not body.endswith('\n'):
+        body += '\n'
+    target = os.path.join(directory, os.path.basename(path))
+    with open(target, 'w') as handle:
+        handle.write(header)
+        for _ in range(scale):
+            handle.write(body)
+    return target
+
+
+def measure(reader, path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader(path)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    frame = reader(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, int(frame.memory_usage(deep=True).sum()), len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=100, help='copies of each file body')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per reader')
+    args = parser.parse_args()
+
+    print(f"{'file':<30}{'rows':>10}{'reader':>16}{'time (ms)':>12}{'peak (MB)':>12}{'frame (MB)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for dataset in DATASETS:
+            for source in sorted(glob.glob(f'dbs/{dataset}/*.csv')):
+                path = scaled_copy(source, args.scale, directory)
+                name = f'{dataset}/{os.path.basename(source)}'
+                for label, reader in [('read+clean', read_then_clean), ('read_dbs_csv', read_dbs_csv)]:
+                    elapsed, peak, size, rows = measure(reader, path, args.repeat)
+                    print(f"{name:<30}{rows:>10}{label:>16}{elapsed * 1000:>12.1f}"
+                          f"{peak / 1e6:>12.2f}{size / 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Import-time and startup cost of the loader modules and the CLI.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_import_time --repeat 5
+#
+# Each module is imported in a fresh interpreter under ``python -X
+# importtime`` and the cumulative microseconds for it are read from the
+# report, so modules already imported by the benchmark itself are not
+# hidden. The CLI rows time a whole ``python -m loaders`` process from
+# start to exit. The median of ``--repeat`` runs is printed, and with
+# ``--out`` appended as a JSON line with the git revision, so a change that
+# pulls pandas or SQLAlchemy back into the quick paths shows up.
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.bench_scale import git_revision
+
+MODULES = [
+    'loaders.cli',
+    'dotenv',
+    'sqlalchemy',
+    'pandas',
+    'loaders.connection',
+    'loaders.models',
+    'loaders.schema',
+    'loaders.catalogue',
+]
+
+COMMANDS = [
+    ['--help'],
+    ['check-driver'],
+]
+
+
+def import_time(module):
+    """Cumulative import time of ``module`` in a fresh interpreter, in seconds."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise ValueError(f"no import time reported for {module}")
+
+
+def startup_time(arguments):
+    """Wall-clock seconds for ``python -m loaders <arguments>`` to exit."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'loaders', *arguments], capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per module, the median is kept")
+    parser.add_argument('--out', metavar='PATH', help="append the results as a JSON line")
+    args = parser.parse_args()
+
+    results = {}
+    for module in MODULES:
+        results[f'import {module}'] = statistics.median(import_time(module) for _ in range(args.repeat))
+    for arguments in COMMANDS:
+        label = f"python -m loaders {' '.join(arguments)}"
+        results[label] = statistics.median(startup_time(arguments) for _ in range(args.repeat))
+
+    print(f"{'':<40}{'ms':>10}")
+    for label, seconds in results.items():
+        print(f"{label:<40}{seconds * 1000:>10.1f}")
+
+    if args.out:
+        with open(args.out, 'a') as handle:
+            handle.write(json.dumps({
+                'revision': git_revision(),
+                'recorded_at': datetime.now(timezone.utc).isoformat(),
+                'seconds': results,
+            }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Throughput of CSV preprocessing on one core versus a process pool.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_parallel_prep --rows 1000000 --processes 1 2 4 8
+#
+# Synthetic copies of every dataset (benchmarks/synthetic.py) are read,
+# trimmed and coerced once in this process with read_table, as the
+# catalogue does, and then through prepare_parallel with each number of
+# ``--processes``. Speed-up is relative to the single-process run. On a
+# host with fewer cores than processes the extra workers only add overhead.
+
+import argparse
+import os
+import tempfile
+import time
+
+from loaders.catalogue import DATASETS, read_table
+from loaders.parallel_prep import DEFAULT_SHARD_BYTES, prepare_parallel
+
+from benchmarks.synthetic import generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('datasets', nargs='*', default=list(DATASETS))
+    parser.add_argument('--rows', type=int, default=1000000, help="rows in the largest table of each dataset")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_BYTES / 2 ** 20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        specs = [spec for name in args.datasets
+                 for spec in generate(name, args.rows, os.path.join(directory, name))]
+        megabytes = sum(os.path.getsize(spec.file) for spec in specs) / 1e6
+
+        start = time.perf_counter()
+        for spec in specs:
+            read_table(spec, cache=False)
+        results = [('in-process', time.perf_counter() - start)]
+        for processes in sorted(set(args.processes)):
+            start = time.perf_counter()
+            prepare_parallel(specs, processes, int(args.shard_mb * 2 ** 20))
+            results.append((f'{processes} processes', time.perf_counter() - start))
+
+    print(f"{megabytes:.0f} MB of CSV on {os.cpu_count()} CPUs")
+    print(f"{'run':<14}{'seconds':>10}{'MB/s':>10}{'speed-up':>10}")
+    for label, seconds in results:
+        print(f"{label:<14}{seconds:>10.2f}{megabytes / seconds:>10.1f}{results[0][1] / seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
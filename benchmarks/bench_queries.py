@@ -0,0 +1,72 @@
+# Round-trips and time of receipts-by-customer lookups, lazy versus batched.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_queries --customers 200 --latency 0.005
+#
+# The bakery dataset is loaded into a fresh SQLite staging file, then the
+# receipts of ``--customers`` customers are read three ways: through the
+# lazy Customer.receipts relationship (one query per customer), through
+# QueryLayer without a cache (one query for the lot), and through QueryLayer
+# a second time with its cache warm (no queries). ``--latency`` adds a
+# sleep to every statement to stand in for the round-trip to Azure SQL.
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from loaders.catalogue import load_dataset
+from loaders.models import Customer
+from loaders.queries import QueryLayer
+from loaders.targets import sqlite_engine
+
+
+def lazy(engine, ids):
+    with Session(engine) as session:
+        customers = session.scalars(select(Customer).where(Customer.Id.in_(ids))).all()
+        return {customer.Id: list(customer.receipts) for customer in customers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=200, help="customers looked up (wraps around)")
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds added to each statement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = sqlite_engine(os.path.join(directory, 'bakery.db'))
+        load_dataset('bakery', engine, cache=False)
+        with engine.connect() as conn:
+            known = list(conn.scalars(select(Customer.Id)))
+        ids = [known[i % len(known)] for i in range(args.customers)]
+        ids = list(dict.fromkeys(ids))
+
+        statements = [0]
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def delay(conn, cursor, statement, parameters, context, executemany):
+            statements[0] += 1
+            time.sleep(args.latency)
+
+        layer = QueryLayer(engine)
+        results = []
+        for label, run in [('lazy', lambda: lazy(engine, ids)),
+                           ('batched', lambda: QueryLayer(engine, cache=None).receipts_by_customer(*ids)),
+                           ('cold cache', lambda: layer.receipts_by_customer(*ids)),
+                           ('warm cache', lambda: layer.receipts_by_customer(*ids))]:
+            statements[0] = 0
+            start = time.perf_counter()
+            run()
+            results.append((label, statements[0], time.perf_counter() - start))
+        engine.dispose()
+
+    print(f"{'lookup':<12}{'statements':>12}{'seconds':>10}")
+    for label, count, seconds in results:
+        print(f"{label:<12}{count:>12}{seconds:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Foreign-key checks against a small reference table: hashed keys versus codes.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_reference_index --rows 2000000
+#
+# A child column of ``--rows`` values is drawn from the goods Id column
+# (the items -> goods foreign key) and checked two ways: hashed and
+# binary-searched in a KeyIndex, as IntegrityChecker does for large
+# parents, and encoded through a ReferenceIndex. The memory columns compare
+# the child column as strings with its integer codes.
+
+import argparse
+import time
+
+from loaders.csv_dialect import read_dbs_csv
+from loaders.integrity import KeyIndex, key_hashes
+from loaders.reference_index import ReferenceIndex
+
+
+def timed(run, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000000, help="values in the child column")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per method, the fastest is kept")
+    args = parser.parse_args()
+
+    goods = read_dbs_csv('dbs/bakery/goods.csv')
+    child = goods['Id'].sample(args.rows, replace=True, random_state=0).reset_index(drop=True)
+
+    hashed = KeyIndex()
+    hashed.add(key_hashes(goods, ['Id']))
+    reference = ReferenceIndex(goods['Id'])
+
+    hash_seconds, found = timed(lambda: hashed.contains(key_hashes(child.to_frame(), ['Id'])), args.repeat)
+    code_seconds, codes = timed(lambda: reference.encode(child), args.repeat)
+    assert found.all() and (codes >= 0).all()
+
+    print(f"{'method':<12}{'seconds':>10}{'MB':>10}")
+    print(f"{'hashed':<12}{hash_seconds:>10.3f}{child.memory_usage(deep=True) / 1e6:>10.1f}")
+    print(f"{'codes':<12}{code_seconds:>10.3f}{codes.nbytes / 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
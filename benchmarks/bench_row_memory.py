@@ -0,0 +1,94 @@
+# Memory per pending row and load time: ORM session versus compact records.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_row_memory --scale 200
+#
+# The students CSV is repeated ``--scale`` times (as in bench_bulk_insert)
+# and held as pending rows four ways: Student instances added to a session,
+# the row dicts bulk_insert builds, record_type(Student) namedtuples, and a
+# RowBatch over the DataFrame. tracemalloc measures what each one allocates
+# on top of the DataFrame. Each is then loaded into a scratch SQLite file.
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from loaders.bulk_loader import bulk_insert, iter_batches
+from loaders.models import Base, Student, Teacher, STUDENT_COLUMNS, TEACHER_COLUMNS
+from loaders.records import RowBatch, insert_records, record_type
+from loaders.targets import sqlite_engine
+
+from benchmarks.bench_bulk_insert import scaled_frames
+
+
+def measured(build):
+    tracemalloc.start()
+    try:
+        pending = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return pending, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=200, help="copies of the students dataset")
+    args = parser.parse_args()
+
+    students_df, teachers_df = scaled_frames(args.scale)
+    frame = students_df.rename(columns=STUDENT_COLUMNS)
+    rows = len(frame)
+    Record = record_type(Student)
+
+    def orm(engine):
+        session = Session(engine)
+        session.add_all([Student(**row) for row in next(iter_batches(frame, rows))])
+        return session
+
+    builders = {
+        'orm': orm,
+        'dicts': lambda engine: next(iter_batches(frame, rows)),
+        'records': lambda engine: [Record(*row) for row in RowBatch.from_frame(frame, Student).rows(0, rows)],
+        'row batch': lambda engine: RowBatch.from_frame(frame, Student),
+    }
+
+    def load_session(session, engine):
+        session.commit()
+        session.close()
+
+    def load_dicts(rows, engine):
+        with engine.begin() as conn:
+            conn.execute(insert(Student), rows)
+
+    loaders = {
+        'orm': load_session,
+        'dicts': load_dicts,
+        'records': lambda pending, engine: insert_records(pending, Student, engine),
+        'row batch': lambda pending, engine: insert_records(pending, Student, engine),
+    }
+
+    print(f"{rows} pending students")
+    print(f"{'rows as':<12}{'bytes/row':>12}{'load s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, build in builders.items():
+            engine = sqlite_engine(os.path.join(directory, f'{name}.db'))
+            Base.metadata.create_all(engine, tables=[Teacher.__table__, Student.__table__])
+            # The students' foreign keys need their teachers first
+            bulk_insert(teachers_df, Teacher, engine, TEACHER_COLUMNS)
+            pending, size = measured(lambda: build(engine))
+            start = time.perf_counter()
+            loaders[name](pending, engine)
+            elapsed = time.perf_counter() - start
+            del pending
+            engine.dispose()
+            print(f"{name:<12}{size / rows:>12.0f}{elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Throughput and memory of every loader stage at growing synthetic scales.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_scale --rows 10000 100000 1000000
+#
+# For each dataset and size, benchmarks/synthetic.py writes a scaled-up
+# copy of the CSVs, which the catalogue then loads into a fresh local
+# SQLite staging file with the columnar cache off, so read, clean,
+# validate, integrity, insert and commit all run every time. Generation is
+# not timed. Each run appends one JSON line to ``--out`` with the git
+# revision, the RunReport stage totals and a memory curve (RSS sampled every
+# ``--interval`` seconds; needs psutil, otherwise only the peak is kept), so
+# results from different loader changes can be compared side by side.
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from loaders.catalogue import DATASETS, load_dataset
+from loaders.metrics import STAGES, RunReport, peak_rss
+from loaders.targets import sqlite_engine
+
+from benchmarks.synthetic import DEFAULT_SKEW, generate
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class MemorySampler(threading.Thread):
+    """Samples this process's RSS in the background as (seconds, bytes) pairs."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        try:
+            import psutil
+            self.process = psutil.Process()
+        except ImportError:
+            self.process = None
+
+    def run(self):
+        if self.process is None:
+            return
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            self.samples.append((round(time.perf_counter() - start, 3), self.process.memory_info().rss))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.samples
+
+
+def run_one(name, rows, directory, skew, interval, workers):
+    specs = generate(name, rows, os.path.join(directory, name), skew)
+    engine = sqlite_engine(os.path.join(directory, f'{name}-{rows}.db'))
+    report = RunReport(f'{name}-{rows}')
+    report.attach(engine)
+    sampler = MemorySampler(interval)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        loaded = load_dataset(name, engine, specs, max_workers=workers, cache=False, report=report)
+    finally:
+        elapsed = time.perf_counter() - start
+        curve = sampler.stop()
+        report.detach()
+        engine.dispose()
+    stages = {stage: sum(span.seconds for span in report.spans if span.stage == stage)
+              for stage in STAGES}
+    total_rows = sum(loaded.values())
+    return {
+        'dataset': name,
+        'rows': rows,
+        'tables': loaded,
+        'seconds': elapsed,
+        'rows_per_sec': total_rows / elapsed if elapsed else None,
+        'stages': stages,
+        'peak_rss': peak_rss(),
+        'memory': curve,
+        'report': report.as_dict()['tables'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('datasets', nargs='*', metavar='dataset', help="default: every dataset")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="sizes of each dataset's largest table")
+    parser.add_argument('--skew', type=float, default=DEFAULT_SKEW, help="Zipf exponent of foreign keys")
+    parser.add_argument('--workers', type=int, default=4, help="tables loaded at the same time")
+    parser.add_argument('--interval', type=float, default=0.05, help="seconds between RSS samples")
+    parser.add_argument('--out', default='bench_scale.jsonl', help="JSON lines file results are appended to")
+    args = parser.parse_args()
+
+    revision, started = git_revision(), datetime.now(timezone.utc).isoformat()
+    print(f"{'dataset':<16}{'rows':>10}{'total (s)':>11}{'rows/s':>11}"
+          + ''.join(f'{stage:>11}' for stage in STAGES) + f"{'peak (MB)':>11}")
+    with tempfile.TemporaryDirectory() as directory, open(args.out, 'a') as results:
+        for rows in args.rows:
+            for name in args.datasets or DATASETS:
+                result = run_one(name, rows, directory, args.skew, args.interval, args.workers)
+                result.update(revision=revision, started=started, skew=args.skew)
+                results.write(json.dumps(result) + '\n')
+                results.flush()
+                print(f"{name:<16}{rows:>10}{result['seconds']:>11.2f}{result['rows_per_sec']:>11.0f}"
+                      + ''.join(f"{result['stages'][stage]:>11.2f}" for stage in STAGES)
+                      + f"{(result['peak_rss'] or 0) / 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
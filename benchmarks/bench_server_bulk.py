@@ -0,0 +1,58 @@
+# Load time of each server-side strategy in loaders/server_bulk.py.
+#
+# Run from the repository root:
+#     python -m benchmarks.bench_server_bulk bakery --rows 200000 --latency 0.05
+#
+# A synthetic copy of the dataset (benchmarks/synthetic.py) is loaded into a
+# fresh SQLite staging file once per strategy. ``--latency`` adds a sleep to
+# every statement sent, to stand in for the round-trip to Azure SQL: the
+# JSON path sends one statement per JSON_BATCH_ROWS rows, where executemany
+# sends one per batch. bcp needs SQL Server and is left out.
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from loaders.catalogue import load_dataset
+from loaders.targets import sqlite_engine
+
+from benchmarks.synthetic import generate
+
+STRATEGIES = ('executemany', 'json')
+
+
+def with_latency(engine, seconds):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def delay(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('INSERT'):
+            time.sleep(seconds)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('dataset', nargs='?', default='bakery')
+    parser.add_argument('--rows', type=int, default=200000, help="rows in the largest table")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to each insert statement")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        specs = generate(args.dataset, args.rows, os.path.join(directory, 'csv'))
+        for strategy in STRATEGIES:
+            engine = with_latency(sqlite_engine(os.path.join(directory, f'{strategy}.db')), args.latency)
+            start = time.perf_counter()
+            load_dataset(args.dataset, engine, specs, cache=False, strategy=strategy)
+            results.append((strategy, time.perf_counter() - start))
+            engine.dispose()
+
+    print(f"{'strategy':<14}{'seconds':>10}")
+    for strategy, seconds in results:
+        print(f"{strategy:<14}{seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
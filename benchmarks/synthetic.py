@@ -0,0 +1,158 @@
+# Synthetic, referentially consistent scale-ups of the dbs/ datasets.
+#
+# Run from the repository root:
+#     python -m benchmarks.synthetic bakery --rows 1000000 --out /tmp/synthetic
+#
+# Every table of a dataset is grown by the same factor, so that its largest
+# table has ``--rows`` rows. Rows are the original rows repeated in order,
+# with the model metadata deciding what has to change:
+#
+#   * primary keys and unique columns get fresh values (integers are
+#     renumbered, text gets a "-<copy>" suffix);
+#   * foreign keys are redrawn from the parent's generated keys with a Zipf
+#     skew, so a few customers, rooms or airports get most of the rows;
+#   * the rest of a composite primary key (Ordinal, FlightNo) counts up
+#     within each parent.
+#
+# Files are written in the dbs/ dialect: the original header line, text in
+# single quotes with doubled apostrophes and NULL for missing numbers. They
+# are written block by block, so 10^7 rows never sit in memory at once.
+
+import argparse
+import os
+
+import numpy
+import pandas
+
+from loaders.bulk_loader import column_keys
+from loaders.catalogue import DATASETS, in_fk_order
+from loaders.csv_dialect import read_dbs_csv
+
+DEFAULT_SKEW = 1.1
+BLOCK_ROWS = 500000
+
+
+def zipf_weights(count, skew, rng):
+    """Return Zipf probabilities over ``count`` parents in random rank order."""
+    weights = 1.0 / numpy.arange(1, count + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def quote(series):
+    """Render a column in the dbs/ dialect: quoted text, bare numbers, NULL."""
+    if pandas.api.types.is_numeric_dtype(series):
+        return series.astype('string').fillna('NULL')
+    text = series.astype('string').str.replace("'", "''", regex=False)
+    return ("'" + text + "'").fillna('NULL')
+
+
+def write_block(frame, handle):
+    lines = quote(frame.iloc[:, 0])
+    for column in frame.columns[1:]:
+        lines = lines + ',' + quote(frame[column])
+    handle.write('\n'.join(lines) + '\n')
+
+
+def _unique(values, start, copy):
+    """Fresh key values for rows ``start``.. of a table with original ``values``."""
+    if pandas.api.types.is_numeric_dtype(values):
+        return numpy.arange(start + 1, start + len(values) + 1)
+    suffix = pandas.Series(copy, index=values.index).astype('string')
+    return values.where(copy == 0, values.astype('string') + '-' + suffix)
+
+
+class TableGenerator:
+    """Writes one scaled-up table and remembers its generated key columns."""
+
+    def __init__(self, spec, rows, keys, skew, rng):
+        self.spec, self.rows, self.skew, self.rng = spec, rows, skew, rng
+        self.original = read_dbs_csv(spec.file, categories=())
+        for name in self.original.select_dtypes('float').columns:
+            # Integer columns with NULLs (wine.Cases) are read as floats
+            values = self.original[name].dropna()
+            if (values == values.round()).all():
+                self.original[name] = self.original[name].astype('Int64')
+        table = spec.model.__table__
+        names = {key: name for name, key in column_keys(spec.model, self.original, spec.columns).items()}
+        unique = {column.key for column in table.primary_key if len(table.primary_key) == 1}
+        unique |= {column.key for column in table.columns if column.unique}
+        self.unique = [names[key] for key in unique]
+        # FK column name -> (parent keys, pick probabilities)
+        self.foreign = {}
+        for fk in table.foreign_keys:
+            parent = keys[(fk.column.table.name, fk.column.key)]
+            self.foreign[names[fk.parent.key]] = (parent, zipf_weights(len(parent), skew, rng))
+        composite = [column for column in table.primary_key if len(table.primary_key) > 1]
+        self.counted = [names[column.key] for column in composite if not column.foreign_keys]
+        self.group = [names[column.key] for column in composite if column.foreign_keys]
+        self.running = {name: numpy.zeros(len(self.foreign[name][0]), dtype='int64')
+                        for name in self.group}
+        self.keys = {(table.name, key): [] for key in unique}
+        self.key_names = {(table.name, key): names[key] for key in unique}
+
+    def blocks(self):
+        for start in range(0, self.rows, BLOCK_ROWS):
+            positions = numpy.arange(start, min(start + BLOCK_ROWS, self.rows))
+            frame = self.original.iloc[positions % len(self.original)].reset_index(drop=True)
+            copy = pandas.Series(positions // len(self.original))
+            for name in self.unique:
+                frame[name] = _unique(frame[name], start, copy)
+            for name, (parent, weights) in self.foreign.items():
+                picks = self.rng.choice(len(parent), size=len(frame), p=weights)
+                frame[name] = parent[picks]
+                if name in self.running:
+                    ordinal = pandas.Series(picks).groupby(picks).cumcount().to_numpy()
+                    for counted in self.counted:
+                        frame[counted] = self.running[name][picks] + ordinal + 1
+                    self.running[name] += numpy.bincount(picks, minlength=len(parent))
+            for key, name in self.key_names.items():
+                self.keys[key].append(frame[name].to_numpy())
+            yield frame
+
+    def write(self, path):
+        with open(self.spec.file) as source:
+            header = source.readline()
+        with open(path, 'w') as handle:
+            handle.write(header)
+            for frame in self.blocks():
+                write_block(frame, handle)
+        return {key: numpy.concatenate(values) for key, values in self.keys.items()}
+
+
+def generate(name, rows, directory, skew=DEFAULT_SKEW, seed=0):
+    """Write a synthetic copy of dataset ``name`` into ``directory``.
+
+    Its largest table gets ``rows`` rows and every other table grows by the
+    same factor. Returns the dataset's TableSpecs pointing at the new files.
+    """
+    rng = numpy.random.default_rng(seed)
+    specs = in_fk_order(DATASETS[name])
+    sizes = {spec.file: len(read_dbs_csv(spec.file)) for spec in specs}
+    factor = rows / max(sizes.values())
+    os.makedirs(directory, exist_ok=True)
+    keys, generated = {}, []
+    for spec in specs:
+        path = os.path.join(directory, os.path.basename(spec.file))
+        count = max(sizes[spec.file], round(sizes[spec.file] * factor))
+        keys.update(TableGenerator(spec, count, keys, skew, rng).write(path))
+        generated.append(spec._replace(file=path))
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic scale-ups of the dbs/ datasets.")
+    parser.add_argument('datasets', nargs='*', metavar='dataset', help="default: every dataset")
+    parser.add_argument('--rows', type=int, default=10000, help="rows in each dataset's largest table")
+    parser.add_argument('--skew', type=float, default=DEFAULT_SKEW, help="Zipf exponent of foreign keys")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='synthetic', help="output directory")
+    args = parser.parse_args()
+
+    for name in args.datasets or DATASETS:
+        for spec in generate(name, args.rows, os.path.join(args.out, name), args.skew, args.seed):
+            print(f"{name}: wrote {spec.file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Shared loading code used by the setup scripts in the repository root.
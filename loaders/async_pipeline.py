@@ -0,0 +1,178 @@
+# Asyncio pipeline that overlaps parsing, checking and database inserts.
+#
+# Each table runs as three stages joined by bounded queues:
+#
+#     read chunks -> [queue] -> coerce, validate, key-check -> [queue] -> insert
+#
+# Parsing, checking and inserting are blocking calls, so each one runs on a
+# worker thread of the pipeline's own pool while the event loop moves chunks
+# along. The caller's loop and its default executor are left alone. The queues hold at
+# most ``queue_size`` chunks, so a slow stage makes the earlier ones wait
+# instead of piling chunks up in memory. Inserts from every table share
+# ``workers`` database slots, each a pooled connection committing one chunk
+# at a time. A child table may parse and check while its parents are still
+# inserting; it only starts inserting once every parent has committed.
+#
+#     python -m loaders.async_pipeline bakery wine --url staging.db
+#
+# Chunks are committed as they arrive, so a failure leaves earlier chunks in
+# the database. Use the catalogue's --resume for loads that must restart.
+
+import argparse
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, bulk_insert
+from loaders.catalogue import DATASETS, coerce
+from loaders.csv_dialect import read_dbs_csv
+from loaders.integrity import IntegrityChecker
+from loaders.parallel_loader import table_dependencies
+from loaders.schema import ensure_tables
+from loaders.streaming import DEFAULT_CHUNK_SIZE
+from loaders.targets import target_engine
+from loaders.validation import validate_frame
+
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+class _Pipeline:
+    def __init__(self, specs, engine, workers, chunksize, queue_size, batch_size, executor=None):
+        self.specs = {spec.model.__table__: spec for spec in specs}
+        self.parents = table_dependencies(self.specs)
+        self.engine = engine
+        self.workers, self.chunksize = workers, chunksize
+        self.queue_size, self.batch_size = queue_size, batch_size
+        self.checker = IntegrityChecker()
+        # Set once a table's keys are all registered, and once it has committed
+        self.checked = {table: asyncio.Event() for table in self.specs}
+        self.loaded = {table: asyncio.Event() for table in self.specs}
+        self.check_lock = asyncio.Lock()
+        self.db_slots = asyncio.Semaphore(workers)
+        self.executor = executor
+
+    def _run(self, function, *args):
+        # Blocking work on the pipeline's threads (the loop's default pool if None)
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def read(self, spec, queue):
+        chunks = read_dbs_csv(spec.file, chunksize=self.chunksize)
+        while True:
+            chunk = await self._run(next, chunks, _DONE)
+            await queue.put(chunk)
+            if chunk is _DONE:
+                return
+
+    def _clean(self, chunk, spec):
+        chunk = coerce(chunk, spec)[0]
+        validate_frame(chunk, spec.model, spec.columns).raise_for_issues()
+        return chunk
+
+    async def check(self, table, spec, chunks, batches):
+        # Orphans can only be found once every parent key has been registered
+        for parent in self.parents[table]:
+            await self.checked[parent].wait()
+        while (chunk := await chunks.get()) is not _DONE:
+            chunk = await self._run(self._clean, chunk, spec)
+            async with self.check_lock:
+                report = await self._run(self.checker.check, chunk, spec.model, spec.columns)
+            report.raise_for_issues()
+            await batches.put(chunk)
+        self.checked[table].set()
+        for _ in range(self.workers):
+            await batches.put(_DONE)
+
+    async def insert(self, table, spec, batches):
+        for parent in self.parents[table]:
+            await self.loaded[parent].wait()
+        rows = 0
+        while (chunk := await batches.get()) is not _DONE:
+            async with self.db_slots:
+                rows += await self._run(bulk_insert, chunk, spec.model, self.engine,
+                                        spec.columns, self.batch_size)
+        return rows
+
+    async def load_table(self, table):
+        spec = self.specs[table]
+        chunks = asyncio.Queue(self.queue_size)
+        batches = asyncio.Queue(self.queue_size)
+        stages = [
+            asyncio.create_task(self.read(spec, chunks)),
+            asyncio.create_task(self.check(table, spec, chunks, batches)),
+            *(asyncio.create_task(self.insert(table, spec, batches)) for _ in range(self.workers)),
+        ]
+        try:
+            results = await asyncio.gather(*stages)
+        except BaseException:
+            # gather leaves the other stages running when one fails, and they
+            # would wait on the queues forever
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        self.loaded[table].set()
+        return sum(results[2:])
+
+    async def run(self):
+        tasks = {asyncio.create_task(self.load_table(table)): table for table in self.specs}
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        return {tasks[task].name: task.result() for task in done}
+
+
+async def pipeline_load_async(specs, engine, workers=4, chunksize=DEFAULT_CHUNK_SIZE,
+                              queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    """Coroutine version of ``pipeline_load``."""
+    # Room for every table's reader and checker next to the database slots
+    with ThreadPoolExecutor(max_workers=workers + 2 * len(specs)) as executor:
+        return await _Pipeline(specs, engine, workers, chunksize, queue_size, batch_size, executor).run()
+
+
+def pipeline_load(specs, engine, workers=4, chunksize=DEFAULT_CHUNK_SIZE,
+                  queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    """Load the tables of ``specs`` (catalogue TableSpecs) through the pipeline.
+
+    Creates missing tables first. Up to ``workers`` chunks are inserted at
+    the same time, and each queue holds at most ``queue_size`` chunks of
+    ``chunksize`` rows. Raises ValueError on the first chunk that fails
+    validation or key checks. Returns a dict of table name -> rows inserted.
+    """
+    ensure_tables(engine, [spec.model.__table__ for spec in specs])
+    return asyncio.run(pipeline_load_async(specs, engine, workers, chunksize, queue_size, batch_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load datasets through the asyncio pipeline.")
+    parser.add_argument('datasets', nargs='*', metavar='dataset',
+                        help=f"datasets to load (default: all of {', '.join(DATASETS)})")
+    parser.add_argument('--url', help="target database URL or local .db file (default: the .env database)")
+    parser.add_argument('--workers', type=int, default=4, help="chunks inserted at the same time")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk")
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE_SIZE, help="chunks held between stages")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    engine = target_engine(args.url)
+    failed = False
+    for name in args.datasets or DATASETS:
+        try:
+            results = pipeline_load(DATASETS[name], engine, args.workers, args.chunksize, args.queue)
+            for table, rows in results.items():
+                print(f"{name}: {table} - {rows} rows uploaded.")
+        except Exception as e:
+            print(f"{name}: An error occurred: {e}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# Bulk upload of DataFrames through executemany-style Core inserts.
+#
+# The setup scripts used to build one ORM object per row and add it to a
+# session. Here the rows go straight to ``insert(table)`` in fixed-size
+# batches, so the driver receives one executemany call per batch. On
+# mssql+pyodbc the cursor's ``fast_executemany`` flag is switched on, which
+# sends each batch to SQL Server as a single parameter array. bulk_upsert
+# sends the same batches through MERGE / INSERT ... ON CONFLICT instead, for
+# reloads where some keys already exist.
+#
+# SQL Server refuses explicit values for an IDENTITY column unless
+# IDENTITY_INSERT is on for the table. SQLAlchemy switches it on for a
+# compiled insert(table), but not for hand-written statements such as the
+# MERGE, so identity_insert does it for those.
+
+from contextlib import contextmanager, nullcontext
+
+from sqlalchemy import event, insert, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _enable_fast_executemany(conn, cursor, statement, parameters, context, executemany):
+    if executemany:
+        cursor.fast_executemany = True
+
+
+def is_mssql_pyodbc(engine):
+    return engine.dialect.name == 'mssql' and engine.dialect.driver == 'pyodbc'
+
+
+def enable_fast_executemany(engine):
+    """Turn on pyodbc ``fast_executemany`` for ``engine``.
+
+    Does nothing on other dialects and is safe to call more than once.
+    """
+    if not is_mssql_pyodbc(engine):
+        return False
+    if not event.contains(engine, 'before_cursor_execute', _enable_fast_executemany):
+        event.listen(engine, 'before_cursor_execute', _enable_fast_executemany)
+    return True
+
+
+def column_keys(model, frame, columns=None):
+    """Map DataFrame column names to table column keys for ``model``.
+
+    ``columns`` renames DataFrame columns to model attribute names (for
+    example ``{'ID': 'id'}``). Columns with no matching attribute are ignored.
+    """
+    columns = columns or {}
+    attr_to_key = {attr.key: attr.columns[0].key for attr in inspect(model).column_attrs}
+    mapping = {}
+    for name in frame.columns:
+        attr = columns.get(name, name)
+        if attr in attr_to_key:
+            mapping[name] = attr_to_key[attr]
+    return mapping
+
+
+def iter_batches(frame, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of plain-Python row dicts, ``batch_size`` rows at a time.
+
+    Missing values are sent as ``None`` so they reach the database as NULL.
+    """
+    for start in range(0, len(frame), batch_size):
+        chunk = frame.iloc[start:start + batch_size]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield chunk.to_dict('records')
+
+
+@contextmanager
+def identity_insert(conn, table, keys):
+    """Let statements on ``conn`` set ``table``'s IDENTITY column explicitly.
+
+    On SQL Server, when ``keys`` include the table's autoincrement column,
+    runs SET IDENTITY_INSERT ON before the block and OFF after it. Does
+    nothing otherwise.
+    """
+    column = table.autoincrement_column
+    if conn.dialect.name != 'mssql' or column is None or column.key not in keys:
+        yield
+        return
+    name = conn.dialect.identifier_preparer.format_table(table)
+    conn.exec_driver_sql(f'SET IDENTITY_INSERT {name} ON')
+    try:
+        yield
+    finally:
+        conn.exec_driver_sql(f'SET IDENTITY_INSERT {name} OFF')
+
+
+def _execute_batches(frame, model, bind, columns, batch_size, statement_for, explicit_identity=False):
+    enable_fast_executemany(bind.engine)
+    mapping = column_keys(model, frame, columns)
+    frame = frame[list(mapping)].rename(columns=mapping)
+    keys = list(frame.columns)
+    statement = statement_for(model.__table__, keys, bind.dialect)
+    total = 0
+    with identity_insert(bind, model.__table__, keys) if explicit_identity else nullcontext():
+        for rows in iter_batches(frame, batch_size):
+            bind.execute(statement, rows)
+            total += len(rows)
+    return total
+
+
+def bulk_insert(frame, model, bind, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert every row of ``frame`` into the table behind ``model``.
+
+    ``bind`` is an Engine or Connection. An Engine gets its own transaction,
+    which is committed once all batches are sent; a Connection is used as-is
+    so the caller controls the transaction. Returns the number of rows sent.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return bulk_insert(frame, model, conn, columns, batch_size)
+    return _execute_batches(frame, model, bind, columns, batch_size,
+                            lambda table, keys, dialect: insert(table))
+
+
+def _merge_statement(table, keys, dialect):
+    # SQL Server has no INSERT ... ON CONFLICT; MERGE one parameter row at a time
+    preparer = dialect.identifier_preparer
+
+    def quote(key):
+        return preparer.quote(table.c[key].name)
+
+    primary_keys = [column.key for column in table.primary_key]
+    others = [key for key in keys if key not in primary_keys]
+    source = ', '.join(f':{key} AS {quote(key)}' for key in keys)
+    match = ' AND '.join(f'target.{quote(key)} = source.{quote(key)}' for key in primary_keys)
+    names = ', '.join(quote(key) for key in keys)
+    values = ', '.join(f'source.{quote(key)}' for key in keys)
+    statement = f'MERGE INTO {preparer.format_table(table)} AS target ' \
+                f'USING (SELECT {source}) AS source ON {match} '
+    if others:
+        updates = ', '.join(f'target.{quote(key)} = source.{quote(key)}' for key in others)
+        statement += f'WHEN MATCHED THEN UPDATE SET {updates} '
+    statement += f'WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({values});'
+    return text(statement)
+
+
+def upsert_statement(table, keys, dialect):
+    """Build an insert-or-update-by-primary-key statement for ``keys``."""
+    if dialect.name == 'mssql':
+        return _merge_statement(table, keys, dialect)
+    if dialect.name == 'sqlite':
+        statement = sqlite.insert(table)
+    elif dialect.name == 'postgresql':
+        statement = postgresql.insert(table)
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect.name}")
+    primary_keys = [column.key for column in table.primary_key]
+    updates = {key: statement.excluded[key] for key in keys if key not in primary_keys}
+    if not updates:
+        return statement.on_conflict_do_nothing(index_elements=primary_keys)
+    return statement.on_conflict_do_update(index_elements=primary_keys, set_=updates)
+
+
+def bulk_upsert(frame, model, bind, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert rows of ``frame`` into ``model``'s table, updating existing keys.
+
+    Uses MERGE on SQL Server and INSERT ... ON CONFLICT on SQLite and
+    PostgreSQL. Otherwise behaves like ``bulk_insert``.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return bulk_upsert(frame, model, conn, columns, batch_size)
+    # The MERGE is plain text, which SQLAlchemy does not wrap in IDENTITY_INSERT
+    return _execute_batches(frame, model, bind, columns, batch_size, upsert_statement,
+                            explicit_identity=True)
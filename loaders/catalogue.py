@@ -0,0 +1,328 @@
+# One loader for every dataset under dbs/, driven by declarative specs.
+#
+# Each dataset is a list of TableSpec entries: the CSV file, the model it
+# loads into, any CSV-to-model column renames and the type coercions the
+# raw values need. Primary keys and load order come from the models
+# themselves. Every dataset goes through the same steps as the setup
+# scripts (read, coerce, validate, check keys, create tables, upload), with
+# one shared engine and independent tables loaded in parallel. Cleaned tables
+# are cached as Arrow files (see loaders/columnar_cache.py), so unchanged
+# CSVs are not parsed or coerced again.
+#
+# Load the whole catalogue with:
+#     python -m loaders.catalogue
+# or a subset into a local staging file with:
+#     python -m loaders.catalogue bakery wine --url staging.db
+
+import argparse
+import os
+import sys
+from collections import namedtuple
+from contextlib import nullcontext
+
+from loaders import columnar_cache
+from loaders.checkpoint import Checkpoints, Quarantine, checkpointed_load
+from loaders.coercion import coerce_frame
+from loaders.connection import get_engine
+from loaders.csv_dialect import read_dbs_csv
+from loaders.incremental import incremental_load
+from loaders.integrity import IntegrityChecker
+from loaders.metrics import STAGES, RunReport, stage
+from loaders.models import (
+    Airline, Airport, Flight, Customer, Good, Receipt, Item, Room, Reservation,
+    Student, Teacher, Grape, Appellation, Wine, RECEIPT_COLUMNS, STUDENT_COLUMNS, TEACHER_COLUMNS,
+)
+from loaders.parallel_loader import load_tables, run_in_fk_order, table_dependencies
+from loaders.schema import SchemaManager
+from loaders.server_bulk import STRATEGIES
+from loaders.targets import target_engine
+from loaders.validation import validate_frame
+
+TableSpec = namedtuple('TableSpec', 'file model columns dates')
+TableSpec.__new__.__defaults__ = (None, None)
+
+DATASETS = {
+    'airlines': [
+        TableSpec('dbs/airlines/airlines.csv', Airline),
+        TableSpec('dbs/airlines/airports100.csv', Airport),
+        TableSpec('dbs/airlines/flights.csv', Flight),
+    ],
+    'bakery': [
+        TableSpec('dbs/bakery/customers.csv', Customer),
+        TableSpec('dbs/bakery/goods.csv', Good),
+        TableSpec('dbs/bakery/receipts.csv', Receipt, RECEIPT_COLUMNS, dates={'Date': '%d-%b-%Y'}),
+        TableSpec('dbs/bakery/items.csv', Item),
+    ],
+    'reservations': [
+        TableSpec('dbs/reservations/Rooms.csv', Room),
+        TableSpec('dbs/reservations/Reservations.csv', Reservation,
+                  dates={'CheckIn': '%d-%b-%y', 'CheckOut': '%d-%b-%y'}),
+    ],
+    'students': [
+        TableSpec('dbs/students/teachers.csv', Teacher, TEACHER_COLUMNS),
+        TableSpec('dbs/students/students.csv', Student, STUDENT_COLUMNS),
+    ],
+    'wine': [
+        TableSpec('dbs/wine/grapes.csv', Grape),
+        TableSpec('dbs/wine/appellations.csv', Appellation),
+        TableSpec('dbs/wine/wine.csv', Wine),
+    ],
+}
+
+
+def coerce(frame, spec):
+    """Apply the type coercions declared in ``spec`` to ``frame``.
+
+    Returns the coerced frame and the per-column ColumnCost list.
+    """
+    return coerce_frame(frame, spec.model, spec.columns, spec.dates)
+
+
+def cache_path(spec, cache_dir=columnar_cache.DEFAULT_CACHE_DIR):
+    """Return where the cleaned table of ``spec`` is cached for its current CSV."""
+    key = columnar_cache.cache_key(spec.file, table=spec.model.__tablename__,
+                                   columns=spec.columns, dates=spec.dates)
+    return columnar_cache.cache_path(spec.file, key, cache_dir)
+
+
+def read_table(spec, cache=True, report=None):
+    """Read and coerce the CSV of ``spec``, or reload it from the columnar cache.
+
+    Returns the frame, the ColumnCost list (empty on a cache hit) and the
+    cache file to write once the frame has been validated, or None.
+    """
+    table = spec.model.__tablename__
+    path = cache_path(spec) if cache and columnar_cache.available() else None
+    if path is not None and os.path.exists(path):
+        with stage(report, 'read', table, bytes=os.path.getsize(path)) as span:
+            frame = columnar_cache.read_cached(path)
+            span.rows = len(frame)
+        return frame, [], None
+    with stage(report, 'read', table, bytes=os.path.getsize(spec.file)) as span:
+        frame = read_dbs_csv(spec.file)
+        span.rows = len(frame)
+    with stage(report, 'clean', table, rows=len(frame)):
+        frame, costs = coerce(frame, spec)
+    return frame, costs, path
+
+
+def in_fk_order(specs):
+    """Return ``specs`` sorted so that parent tables come before their children."""
+    by_table = {spec.model.__table__: spec for spec in specs}
+    parents = table_dependencies(by_table)
+    ordered, done = [], set()
+    while len(ordered) < len(specs):
+        ready = [table for table in by_table if table not in done and parents[table] <= done]
+        if not ready:
+            raise ValueError("Circular foreign keys in dataset specs")
+        for table in sorted(ready, key=lambda table: table.name):
+            ordered.append(by_table[table])
+            done.add(table)
+    return ordered
+
+
+def prepare_dataset(name, specs=None, cache=True, report=None):
+    """Read, coerce, validate and key-check every table of dataset ``name``.
+
+    Returns a dict of model -> DataFrame, or None after printing every
+    problem found. With ``cache`` tables that pass validation are cached,
+    and cached tables are reloaded instead of parsed. Each step is timed
+    into ``report`` (a RunReport) if given.
+    """
+    specs = in_fk_order(specs or DATASETS[name])
+    frames, issues_found = {}, False
+    checker = IntegrityChecker()
+    pending = {}
+    for spec in specs:
+        table = spec.model.__tablename__
+        frame, costs, path = read_table(spec, cache, report)
+        for cost in costs:
+            print(f"{name}: {spec.model.__tablename__}.{cost.column} - converted {cost.rows} rows "
+                  f"({cost.distinct} distinct) to {cost.kind} in {cost.seconds * 1000:.1f} ms")
+        with stage(report, 'validate', table, rows=len(frame)):
+            validation = validate_frame(frame, spec.model, spec.columns)
+        with stage(report, 'integrity', table, rows=len(frame)):
+            integrity = checker.check(frame, spec.model, spec.columns)
+        for message in validation.messages() + integrity.messages():
+            print(f"{name}: {message}")
+            issues_found = True
+        frames[spec.model] = frame
+        if path is not None:
+            pending[path] = frame
+    if issues_found:
+        return None
+    # Only cache a dataset whose tables all validated and key-checked cleanly
+    for path, frame in pending.items():
+        columnar_cache.write_cached(frame, path)
+    return frames
+
+
+def load_checkpointed(name, frames, engine, specs, resume=False, max_workers=4, report=None):
+    """Load prepared ``frames`` one committed batch at a time.
+
+    Rows that fail are quarantined rather than stopping the load, and
+    ``resume=True`` skips batches committed by an interrupted earlier run.
+    """
+    columns = {spec.model: spec.columns for spec in specs}
+    checkpoints, quarantine = Checkpoints(), Quarantine()
+
+    def load(model, frame):
+        table = model.__tablename__
+        with stage(report, 'insert', table) as span:
+            result = checkpointed_load(frame, model, engine, columns.get(model), resume=resume,
+                                       checkpoints=checkpoints, quarantine=quarantine)
+            span.rows = result.rows - result.skipped
+        if result.skipped:
+            print(f"{name}: {table} - resumed after {result.skipped} committed rows.")
+        if result.quarantined:
+            print(f"{name}: {table} - {result.quarantined} rows quarantined in {quarantine.path(table)}")
+        return result.rows
+
+    def task(model, frame):
+        return lambda: load(model, frame)
+
+    try:
+        return run_in_fk_order({model.__table__: task(model, frame) for model, frame in frames.items()},
+                               max_workers)
+    finally:
+        checkpoints.close()
+
+
+def load_dataset(name, engine, specs=None, incremental=False, max_workers=4, cache=True,
+                 report=None, checkpointed=False, resume=False, bulk_mode=False,
+                 strategy='executemany', frames=None):
+    """Load dataset ``name`` into ``engine``. Returns a dict of table -> rows sent.
+
+    With ``incremental=True`` unchanged files are skipped without being read,
+    so each changed block is coerced and validated as it is loaded instead
+    of every table being checked up front; the whole of each table is then
+    timed as its insert stage. With ``checkpointed=True`` (implied by
+    ``resume``) every batch is committed on its own, see load_checkpointed.
+    ``bulk_mode=True`` drops the tables' secondary indexes and foreign keys
+    while they load. Missing tables and columns are created first.
+    ``strategy`` picks how rows are sent (see loaders/server_bulk.py); the
+    incremental and checkpointed loads have their own way of sending rows.
+    ``frames`` (model -> DataFrame) are tables already read and checked, for
+    example by loaders/parallel_prep.py; they are loaded as they are.
+    """
+    specs = specs or DATASETS[name]
+    tables = [spec.model.__table__ for spec in specs]
+    schema = SchemaManager(engine)
+    if incremental:
+        def prepare(chunk, spec):
+            chunk = coerce(chunk, spec)[0]
+            validate_frame(chunk, spec.model, spec.columns).raise_for_issues()
+            return chunk
+
+        def load(spec):
+            with stage(report, 'insert', spec.model.__tablename__) as span:
+                span.rows = incremental_load(spec.file, spec.model, engine, spec.columns,
+                                             prepare=lambda chunk: prepare(chunk, spec))
+            return span.rows
+
+        def task(spec):
+            return lambda: load(spec)
+
+        schema.sync(tables)
+        with schema.bulk_load_mode(tables) if bulk_mode else nullcontext():
+            return run_in_fk_order({spec.model.__table__: task(spec) for spec in specs}, max_workers)
+
+    if frames is None:
+        frames = prepare_dataset(name, specs, cache, report)
+    if frames is None:
+        raise ValueError(f"{name}: validation failed, nothing was loaded")
+    schema.sync(tables)
+    with schema.bulk_load_mode(tables) if bulk_mode else nullcontext():
+        if checkpointed or resume:
+            return load_checkpointed(name, frames, engine, specs, resume, max_workers, report)
+        return load_tables(frames, engine, columns={spec.model: spec.columns for spec in specs},
+                           max_workers=max_workers, report=report, strategy=strategy)
+
+
+def load_catalogue(names=None, engine=None, incremental=False, max_workers=4, cache=True,
+                   report=None, checkpointed=False, resume=False, bulk_mode=False,
+                   strategy='executemany', processes=None):
+    """Load every dataset in ``names`` (all of them by default) with one engine.
+
+    Returns a dict of dataset -> {table: rows sent}. A dataset that fails is
+    reported and skipped; the others still load. Pass a RunReport as
+    ``report`` to collect stage timings. ``checkpointed``, ``resume``,
+    ``bulk_mode`` and ``strategy`` are passed on to load_dataset. With
+    ``processes`` every dataset is read and checked up front in that many
+    worker processes (see loaders/parallel_prep.py), bypassing the cache.
+    """
+    engine = engine if engine is not None else get_engine()
+    if report is not None:
+        report.attach(engine)
+    prepared = {}
+    if processes and not incremental:
+        # parallel_prep builds on this module's specs
+        from loaders.parallel_prep import prepare_catalogue
+        with stage(report, 'clean'):
+            prepared = prepare_catalogue(names, processes)
+    results = {}
+    for name in names or DATASETS:
+        try:
+            if name in prepared and prepared[name] is None:
+                raise ValueError(f"{name}: validation failed, nothing was loaded")
+            results[name] = load_dataset(name, engine, incremental=incremental,
+                                         max_workers=max_workers, cache=cache, report=report,
+                                         checkpointed=checkpointed, resume=resume,
+                                         bulk_mode=bulk_mode, strategy=strategy,
+                                         frames=prepared.get(name))
+            for table, rows in results[name].items():
+                print(f"{name}: {table} - {rows} rows uploaded.")
+        except Exception as e:
+            print(f"{name}: An error occurred: {e}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the datasets under dbs/.")
+    parser.add_argument('datasets', nargs='*', metavar='dataset',
+                        help=f"datasets to load (default: all of {', '.join(DATASETS)})")
+    parser.add_argument('--url', help="target database URL or local .db file (default: the .env database)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="upload only rows that are new or changed since the last run")
+    parser.add_argument('--workers', type=int, default=4, help="tables loaded at the same time")
+    parser.add_argument('--checkpoint', action='store_true',
+                        help="commit every batch, retry dropped connections and quarantine failed rows")
+    parser.add_argument('--resume', action='store_true',
+                        help="like --checkpoint, carrying on after the batches an earlier run committed")
+    parser.add_argument('--bulk-mode', action='store_true',
+                        help="drop secondary indexes and foreign keys while loading, then re-create them")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='executemany',
+                        help="how rows are sent; auto picks JSON or bcp bulk paths for large tables")
+    parser.add_argument('--processes', type=int,
+                        help="read and check every dataset up front in this many processes")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="always parse the CSVs instead of reloading cached tables")
+    parser.add_argument('--report', metavar='PATH', help="write stage timings and table metrics as JSON")
+    parser.add_argument('--profile', choices=STAGES,
+                        help="run one stage under cProfile (saved next to --report)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    if args.profile and not args.report:
+        parser.error("--profile needs --report")
+    if args.incremental and (args.checkpoint or args.resume):
+        parser.error("--incremental cannot be combined with --checkpoint or --resume")
+    if args.incremental and args.processes:
+        parser.error("--incremental cannot be combined with --processes")
+    if args.strategy != 'executemany' and (args.incremental or args.checkpoint or args.resume):
+        parser.error("--strategy cannot be combined with --incremental, --checkpoint or --resume")
+
+    engine = target_engine(args.url)
+    report = RunReport('catalogue', args.profile) if args.report else None
+    results = load_catalogue(args.datasets or None, engine, args.incremental, args.workers,
+                             args.cache, report, args.checkpoint, args.resume, args.bulk_mode,
+                             args.strategy, args.processes)
+    if report is not None:
+        print(f"Run report written to {report.write(args.report)}")
+    return 0 if len(results) == len(args.datasets or DATASETS) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# Resumable uploads: one commit per batch, a checkpoint after each commit.
+#
+# bulk_insert sends a whole table in one transaction, so a dropped Azure SQL
+# connection near the end throws every batch away. checkpointed_load commits
+# each batch on its own and then records it in a local SQLite file, keyed by
+# target, table and a fingerprint of the rows being loaded. With
+# ``resume=True`` a load of the same rows carries on after the last recorded
+# batch instead of starting over.
+#
+#   * Transient errors (dropped connections, Azure SQL throttling and
+#     failover codes) are retried with exponential backoff. A retried batch
+#     and the first batch after a resume may already have committed, so
+#     their keys are looked up first. Rows already stored with the same
+#     values are skipped, and rows whose key is stored with other values are
+#     quarantined, never overwritten.
+#   * A constraint violation or bad value splits the batch in halves until
+#     the rows that fail on their own are found. Those go to a quarantine
+#     CSV with the error message, and the rest of the batch is committed.
+#     Any other error stops the load; its checkpoint is kept for --resume.
+
+import csv
+import datetime
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, column_keys, enable_fast_executemany, iter_batches
+from loaders.incremental import target_name
+from loaders.integrity import key_hashes
+
+DEFAULT_CHECKPOINTS = '.load_checkpoints.db'
+DEFAULT_QUARANTINE_DIR = 'quarantine'
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5  # seconds before the first retry; doubled on each one
+# Keys per lookup query; SQL Server takes at most 2100 parameters
+LOOKUP_CHUNK = 1000
+
+# SQL Server errors worth retrying: Azure SQL throttling, failover and
+# resource limits, deadlocks, login timeouts and dropped TCP connections
+TRANSIENT_CODES = ('40613', '40501', '40197', '40540', '49918', '49919', '49920', '10928',
+                   '10929', '4060', '4221', '1205', '10053', '10054', '10060', '233', '64')
+# ODBC states for lost connections and timeouts, and SQLite's busy errors
+TRANSIENT_MESSAGES = ('08S01', '08001', 'HYT00', 'HYT01', 'database is locked')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    target TEXT, tbl TEXT, fingerprint TEXT, batch_size INTEGER, batches INTEGER,
+    rows INTEGER, quarantined INTEGER, updated_at REAL,
+    PRIMARY KEY (target, tbl)
+);
+"""
+
+LoadResult = namedtuple('LoadResult', 'rows quarantined retries skipped')
+
+
+def is_transient(error):
+    """Whether ``error`` is worth retrying on a fresh connection."""
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    message = str(error.orig)
+    return (any(f'({code})' in message or f'[{code}]' in message for code in TRANSIENT_CODES)
+            or any(text in message for text in TRANSIENT_MESSAGES))
+
+
+class Checkpoints:
+    """The last committed batch of each table, kept in a SQLite file."""
+
+    def __init__(self, path=DEFAULT_CHECKPOINTS):
+        self.path = path
+        # Tables loaded in parallel share one connection
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def get(self, target, table):
+        with self.lock:
+            return self.db.execute(
+                'SELECT fingerprint, batch_size, batches, rows, quarantined FROM checkpoints '
+                'WHERE target = ? AND tbl = ?', (target, table)).fetchone()
+
+    def save(self, target, table, fingerprint, batch_size, batches, rows, quarantined):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (target, table, fingerprint, batch_size, batches, rows, quarantined,
+                             time.time()))
+            self.db.commit()
+
+    def forget(self, target, table):
+        with self.lock:
+            self.db.execute('DELETE FROM checkpoints WHERE target = ? AND tbl = ?', (target, table))
+            self.db.commit()
+
+
+def _as_written(row):
+    # A row the way csv writes it and reads it back, without the error
+    return tuple((key, '' if value is None else str(value)) for key, value in row.items() if key != 'error')
+
+
+class Quarantine:
+    """Appends rows that could not be loaded to ``<directory>/<table>.csv``.
+
+    Rows already in the file, for example from the run a resumed load
+    carries on from, are counted but not written again.
+    """
+
+    def __init__(self, directory=DEFAULT_QUARANTINE_DIR):
+        self.directory = directory
+        self._written = {}
+
+    def path(self, table):
+        return os.path.join(self.directory, f'{table}.csv')
+
+    def written_rows(self, table):
+        """The rows in ``table``'s file, read once and then kept up to date."""
+        if table not in self._written:
+            rows = set()
+            if os.path.exists(self.path(table)):
+                with open(self.path(table), newline='') as handle:
+                    rows = {_as_written(record) for record in csv.DictReader(handle)}
+            self._written[table] = rows
+        return self._written[table]
+
+    def add(self, table, rows, error):
+        written, new = self.written_rows(table), []
+        for row in rows:
+            if _as_written(row) not in written:
+                written.add(_as_written(row))
+                new.append(row)
+        if not new:
+            return len(rows)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(table)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=[*new[0], 'error'])
+            if new_file:
+                writer.writeheader()
+            for row in new:
+                writer.writerow({**row, 'error': str(getattr(error, 'orig', error)).strip()})
+        return len(rows)
+
+
+def frame_fingerprint(frame, batch_size):
+    """Identify the rows of ``frame`` and how they are split into batches."""
+    digest = hashlib.sha256(key_hashes(frame, list(frame.columns)).tobytes())
+    digest.update(str(batch_size).encode())
+    return digest.hexdigest()
+
+
+def _send(engine, table, rows):
+    with engine.begin() as conn:
+        conn.execute(insert(table), rows)
+
+
+def _same(sent, stored):
+    # Values as sent (pandas Timestamps, floats for gappy integers) against
+    # values read back (dates, Decimals, ints)
+    if sent is None or stored is None:
+        return sent is None and stored is None
+    if isinstance(stored, datetime.date) and hasattr(sent, 'to_pydatetime'):
+        sent = sent.to_pydatetime()
+        if not isinstance(stored, datetime.datetime):
+            sent = sent.date()
+    if isinstance(sent, (int, float)) and not isinstance(sent, bool) or hasattr(stored, 'as_tuple'):
+        try:
+            return abs(float(sent) - float(stored)) < 1e-9
+        except (TypeError, ValueError):
+            return False
+    return sent == stored
+
+
+def stored_rows(engine, table, rows):
+    """Return the rows of ``table`` sharing a primary key with ``rows``, by key."""
+    keys = [column.key for column in table.primary_key]
+    found = {}
+    # Filter on the first key column only (SQL Server has no tuple IN) and
+    # match whole keys here
+    first = sorted({row[keys[0]] for row in rows}, key=str)
+    with engine.connect() as conn:
+        for start in range(0, len(first), LOOKUP_CHUNK):
+            statement = select(table).where(table.c[keys[0]].in_(first[start:start + LOOKUP_CHUNK]))
+            for stored in conn.execute(statement).mappings():
+                found[tuple(stored[key] for key in keys)] = stored
+    return found
+
+
+class _BatchSender:
+    def __init__(self, engine, table, quarantine, retries, backoff):
+        self.engine, self.table, self.quarantine = engine, table, quarantine
+        self.retries, self.backoff = retries, backoff
+        self.retried = self.quarantined = 0
+        self.keys = [column.key for column in table.primary_key]
+
+    def reconcile(self, rows):
+        """Split ``rows`` that may have committed into (to send, already stored).
+
+        Rows whose key is stored with different values are quarantined.
+        """
+        if not self.keys or not all(key in rows[0] for key in self.keys):
+            return rows, 0
+        found = stored_rows(self.engine, self.table, rows)
+        pending, present, conflicts, matched = [], 0, [], set()
+        for row in rows:
+            key = tuple(row[name] for name in self.keys)
+            stored = found.get(key)
+            if stored is None:
+                pending.append(row)
+            elif key not in matched and all(_same(value, stored[name]) for name, value in row.items()):
+                # A second copy of the key in the batch cannot be the stored row too
+                matched.add(key)
+                present += 1
+            else:
+                conflicts.append(row)
+        if conflicts:
+            self.quarantined += self.quarantine.add(
+                self.table.name, conflicts, "primary key already stored with different values")
+        return pending, present
+
+    def send(self, rows, uncertain=False):
+        """Commit ``rows``, retrying transient errors.
+
+        With ``uncertain=True`` some rows may have committed already; see
+        reconcile. Returns the rows now stored from ``rows``.
+        """
+        present = 0
+        for attempt in range(self.retries + 1):
+            if uncertain:
+                rows, stored = self.reconcile(rows)
+                present += stored
+                if not rows:
+                    return present
+            try:
+                _send(self.engine, self.table, rows)
+                return present + len(rows)
+            except DBAPIError as e:
+                if isinstance(e, (IntegrityError, DataError)):
+                    return present + self.split(rows, e)
+                if not is_transient(e) or attempt == self.retries:
+                    raise
+                self.retried += 1
+                # The commit may have landed before the connection dropped
+                uncertain = True
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def split(self, rows, error):
+        # Halves of a batch that failed as a whole did not commit
+        if len(rows) == 1:
+            self.quarantined += self.quarantine.add(self.table.name, rows, error)
+            return 0
+        middle = len(rows) // 2
+        return self.send(rows[:middle]) + self.send(rows[middle:])
+
+
+def checkpointed_load(frame, model, engine, columns=None, batch_size=DEFAULT_BATCH_SIZE,
+                      resume=False, checkpoints=None, quarantine=None,
+                      retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Insert ``frame`` into ``model``'s table, committing one batch at a time.
+
+    With ``resume=True`` batches recorded in ``checkpoints`` by an earlier
+    load of the same rows are skipped; otherwise the table's checkpoint is
+    reset. Rows that break a constraint or hold a bad value are written to
+    ``quarantine`` instead of stopping the load, and so are rows whose key
+    is already stored with other values. Returns a LoadResult of rows
+    stored (counting earlier runs when resuming), rows quarantined, retries
+    made and rows skipped because they were already committed.
+    """
+    owns_checkpoints = checkpoints is None
+    checkpoints = checkpoints or Checkpoints()
+    try:
+        return _checkpointed_load(frame, model, engine, columns, batch_size, resume, checkpoints,
+                                  quarantine or Quarantine(), retries, backoff)
+    finally:
+        if owns_checkpoints:
+            checkpoints.close()
+
+
+def _checkpointed_load(frame, model, engine, columns, batch_size, resume, checkpoints,
+                       quarantine, retries, backoff):
+    enable_fast_executemany(engine)
+    mapping = column_keys(model, frame, columns)
+    frame = frame[list(mapping)].rename(columns=mapping)
+    target, table = target_name(engine), model.__tablename__
+    fingerprint = frame_fingerprint(frame, batch_size)
+
+    done, rows, quarantined = 0, 0, 0
+    state = checkpoints.get(target, table)
+    if resume and state is not None and state[0] == fingerprint:
+        done, rows, quarantined = state[2], state[3], state[4]
+    else:
+        checkpoints.forget(target, table)
+
+    sender = _BatchSender(engine, model.__table__, quarantine, retries, backoff)
+    skipped = min(done * batch_size, len(frame))
+    for number, batch in enumerate(iter_batches(frame.iloc[skipped:], batch_size), start=done):
+        # The first resumed batch may have committed without being recorded
+        rows += sender.send(batch, uncertain=resume and number == done)
+        checkpoints.save(target, table, fingerprint, batch_size, number + 1, rows,
+                         quarantined + sender.quarantined)
+    return LoadResult(rows, quarantined + sender.quarantined, sender.retried, skipped)
@@ -0,0 +1,137 @@
+# One command-line entry point for the loaders, with subcommands:
+#
+#     python -m loaders check-driver                  # is the ODBC driver installed?
+#     python -m loaders list-tables --url staging.db  # tables on the target
+#     python -m loaders validate bakery wine          # parse and check, load nothing
+#     python -m loaders load bakery --url staging.db  # same options as loaders.catalogue
+#     python -m loaders bench scale --rows 10000      # runs benchmarks/bench_scale.py
+#
+# Only the standard library is imported up front. pandas, SQLAlchemy and the
+# models are imported inside the subcommands that need them, so the quick
+# diagnostics start without paying for them (see benchmarks/bench_import_time.py).
+# Nothing builds an engine until a subcommand asks for one.
+
+import argparse
+import os
+import sys
+
+DEFAULT_DRIVER = '{ODBC Driver 17 for SQL Server}'
+BENCHMARKS_DIR = 'benchmarks'
+
+
+def check_driver(args):
+    """Report whether the ODBC driver named by DB_DRIVER is installed."""
+    try:
+        import pyodbc
+    except ImportError:
+        print("pyodbc is not installed")
+        return 1
+    if args.driver is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+    driver = (args.driver or os.getenv('DB_DRIVER', DEFAULT_DRIVER)).strip('{}')
+    if driver in pyodbc.drivers():
+        print(f"{driver} is installed")
+        return 0
+    print(f"{driver} is not installed")
+    return 1
+
+
+def list_tables(args):
+    """Print the tables on the target, reflected in one batched pass."""
+    from loaders.schema import SchemaManager
+    from loaders.targets import target_engine
+
+    # Always ask the server; a listing from the cache would hide a broken connection
+    print(SchemaManager(target_engine(args.url)).table_names(refresh=True))
+    return 0
+
+
+def validate(args):
+    """Read and check datasets without loading them."""
+    from loaders.catalogue import DATASETS, prepare_dataset
+
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        print(f"Unknown datasets: {', '.join(unknown)}")
+        return 2
+    if args.processes:
+        from loaders.parallel_prep import prepare_catalogue
+        prepared = prepare_catalogue(args.datasets or None, args.processes)
+    failed = False
+    for name in args.datasets or DATASETS:
+        frames = prepared[name] if args.processes else prepare_dataset(name, cache=args.cache)
+        if frames is None:
+            failed = True
+            continue
+        for model, frame in frames.items():
+            print(f"{name}: {model.__tablename__} - {len(frame)} rows valid.")
+    return 1 if failed else 0
+
+
+def load(args):
+    """Hand the remaining arguments to the catalogue loader."""
+    from loaders.catalogue import main as catalogue_main
+
+    return catalogue_main(args.rest)
+
+
+def benchmarks():
+    """Names of the benchmarks in benchmarks/, without the bench_ prefix."""
+    if not os.path.isdir(BENCHMARKS_DIR):
+        return []
+    return sorted(name[len('bench_'):-len('.py')] for name in os.listdir(BENCHMARKS_DIR)
+                  if name.startswith('bench_') and name.endswith('.py'))
+
+
+def bench(args):
+    """Run one benchmark module with the remaining arguments."""
+    import runpy
+
+    if args.name not in benchmarks():
+        print(f"Unknown benchmark: {args.name} (choose from {', '.join(benchmarks())})")
+        return 2
+    module = f'{BENCHMARKS_DIR}.bench_{args.name}'
+    sys.argv = [module, *args.rest]
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loaders', description="Load and check the datasets under dbs/.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('check-driver', help="check that the ODBC driver is installed")
+    command.add_argument('--driver', help="driver name (default: DB_DRIVER from .env)")
+    command.set_defaults(run=check_driver)
+
+    command = commands.add_parser('list-tables', help="list the tables on the target database")
+    command.add_argument('--url', help="target database URL or local .db file (default: the .env database)")
+    command.set_defaults(run=list_tables)
+
+    command = commands.add_parser('validate', help="read and check datasets without loading them")
+    command.add_argument('datasets', nargs='*', metavar='dataset', help="datasets to check (default: all)")
+    command.add_argument('--no-cache', dest='cache', action='store_false',
+                         help="always parse the CSVs instead of reloading cached tables")
+    command.add_argument('--processes', type=int, help="read and check in this many processes (no cache)")
+    command.set_defaults(run=validate)
+
+    command = commands.add_parser('load', add_help=False,
+                                  help="load datasets (see python -m loaders.catalogue --help)")
+    command.set_defaults(run=load, passthrough=True)
+
+    command = commands.add_parser('bench', add_help=False,
+                                  help="run a benchmark from benchmarks/ (bench NAME --help for its options)")
+    command.add_argument('name', help="benchmark name, e.g. scale for bench_scale.py")
+    command.set_defaults(run=bench, passthrough=True)
+
+    # load and bench hand everything they do not know on to the module they run
+    args, rest = parser.parse_known_args(argv)
+    if rest and not getattr(args, 'passthrough', False):
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    args.rest = rest
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
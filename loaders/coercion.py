@@ -0,0 +1,100 @@
+# Cached, vectorized coercion of date and decimal columns.
+#
+# receipts.csv stores dates as '28-Oct-2007' and Reservations.csv as
+# '01-JAN-10'. Both repeat a lot (200 receipts fall on 31 dates), so each
+# distinct value is converted once with a fixed format and the results are
+# broadcast back to every row by factorized code. Numeric columns are turned
+# into exact Decimals the same way: one Decimal per distinct value, built
+# from a scaled integer rather than from the binary float. coerce_frame
+# times every column it converts.
+
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy
+import pandas
+from sqlalchemy import Date, DateTime, Float, Numeric
+
+from loaders.bulk_loader import column_keys
+
+ColumnCost = namedtuple('ColumnCost', 'column kind rows distinct seconds')
+
+# Most decimal places tried when a Numeric column declares no scale
+MAX_INFERRED_SCALE = 6
+
+
+def cached(series, convert, dtype=object):
+    """Apply ``convert`` to the distinct values of ``series`` only.
+
+    ``convert`` receives an array of distinct non-null values and returns an
+    array of converted values in the same order. Nulls stay null.
+    """
+    codes, uniques = pandas.factorize(series)
+    converted = numpy.asarray(convert(numpy.asarray(uniques)), dtype=dtype)
+    if dtype == object:
+        missing = numpy.array([None], dtype=object)
+    else:
+        missing = numpy.array([numpy.datetime64('NaT')], dtype=converted.dtype)
+    # factorize marks nulls with -1, which picks the appended missing value
+    values = numpy.concatenate([converted, missing]).take(codes)
+    return pandas.Series(values, index=series.index, name=series.name)
+
+
+def parse_dates(series, date_format):
+    """Parse date strings in ``date_format`` (e.g. '%d-%b-%Y') to datetime64."""
+    if pandas.api.types.is_datetime64_any_dtype(series):
+        return series
+    return cached(series, lambda values: pandas.to_datetime(values, format=date_format).to_numpy(),
+                  dtype='datetime64[ns]')
+
+
+def decimal_places(values, limit=MAX_INFERRED_SCALE):
+    """Return the fewest decimal places (up to ``limit``) that hold ``values`` exactly."""
+    values = numpy.asarray(values, dtype='float64')
+    for scale in range(limit + 1):
+        scaled = values * 10 ** scale
+        if numpy.allclose(scaled, numpy.rint(scaled), rtol=0, atol=1e-6):
+            return scale
+    return limit
+
+
+def to_decimal(series, scale=None):
+    """Convert a numeric column to exact Decimals with ``scale`` decimal places.
+
+    Without ``scale`` the smallest scale that represents every value is used.
+    """
+    def convert(values):
+        values = pandas.to_numeric(values).astype('float64')
+        places = decimal_places(values) if scale is None else scale
+        scaled = numpy.rint(values * 10 ** places).astype('int64')
+        return [Decimal(int(value)).scaleb(-places) for value in scaled]
+
+    return cached(series, convert)
+
+
+def coerce_frame(frame, model, columns=None, dates=None):
+    """Coerce ``frame``'s Date and Numeric columns for ``model``.
+
+    ``dates`` maps DataFrame columns to their strptime format; Date columns
+    not listed there are left alone. Numeric (but not Float) columns become
+    Decimals at the model column's scale. Returns the coerced frame and a
+    list of ColumnCost, one per converted column.
+    """
+    dates = dates or {}
+    frame = frame.copy()
+    costs = []
+    for name, key in column_keys(model, frame, columns).items():
+        column_type = model.__table__.columns[key].type
+        start = time.perf_counter()
+        if isinstance(column_type, (Date, DateTime)) and name in dates:
+            kind = 'date'
+            frame[name] = parse_dates(frame[name], dates[name])
+        elif isinstance(column_type, Numeric) and not isinstance(column_type, Float):
+            kind = 'decimal'
+            frame[name] = to_decimal(frame[name], column_type.scale)
+        else:
+            continue
+        costs.append(ColumnCost(name, kind, len(frame), int(frame[name].nunique()),
+                                time.perf_counter() - start))
+    return frame, costs
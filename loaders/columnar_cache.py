@@ -0,0 +1,78 @@
+# Columnar cache of cleaned tables, keyed on the source CSV's content.
+#
+# Parsing the quoted dbs/ CSVs, inferring dtypes and coercing dates and
+# decimals is repeated on every run even when nothing changed. Once a table
+# has been cleaned and validated it is written as an uncompressed Arrow IPC
+# file named after a hash of the source CSV and of how it was prepared.
+# Later runs memory-map that file instead, so reading a table costs little
+# more than mapping it. Needs pyarrow; without it nothing is cached.
+
+import hashlib
+import json
+import os
+
+from loaders.incremental import file_digest
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'columnar')
+
+# Bump when the cleaning or coercion code changes what a cached table holds
+CACHE_VERSION = 1
+
+
+def available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cache_key(source, **details):
+    """Hash ``source``'s content together with how it is prepared."""
+    digest = hashlib.sha256(file_digest(source).encode())
+    digest.update(json.dumps([CACHE_VERSION, details], sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_path(source, key, cache_dir=DEFAULT_CACHE_DIR):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir, f'{name}-{key}.arrow')
+
+
+def read_cached(path):
+    """Memory-map a cached table and return it as a DataFrame, or None if absent."""
+    if not os.path.exists(path) or not available():
+        return None
+    import pyarrow
+
+    with pyarrow.memory_map(path) as source:
+        table = pyarrow.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def write_cached(frame, path):
+    """Write ``frame`` to ``path`` as an uncompressed Arrow IPC file."""
+    if not available():
+        return False
+    import pyarrow
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    # Write under a temporary name so a crash never leaves a truncated cache file
+    partial = f'{path}.partial'
+    with pyarrow.OSFile(partial, 'wb') as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(partial, path)
+    return True
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Delete every cached table. Returns the number of files removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.arrow'):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,215 @@
+# Process-wide, pooled database engine shared by every setup script.
+#
+# The scripts used to read the five DB_* variables from .env and call
+# create_engine themselves, each with default pool settings. get_engine
+# builds the engine once per URL and hands the same one to every caller. The
+# pool pre-pings connections and recycles them before Azure SQL's idle
+# timeout closes them on the server side, and PoolStats counts checkouts,
+# waits and reconnects so the cost of opening connections is visible.
+#
+# Pool settings come from keyword arguments, then from the environment:
+#     DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import QueuePool
+
+POOL_DEFAULTS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    # Azure SQL drops idle connections after 30 minutes
+    'pool_recycle': 1500,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class PoolStats:
+    """Counters for one engine's connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.connects = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.reconnects = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+        if 'wait_time' in counts:
+            self._local.wait_time = self.thread_wait_time() + counts['wait_time']
+
+    def thread_wait_time(self):
+        """Seconds the calling thread has spent waiting on the pool."""
+        return getattr(self._local, 'wait_time', 0.0)
+
+    def as_dict(self):
+        return {
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'wait_time': self.wait_time,
+            'reconnects': self.reconnects,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout spends in the pool.
+
+    A checkout counts as a wait when no idle connection was available, so it
+    had to open a new one or block until another thread returned one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.stats = PoolStats()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self):
+        idle = self.checkedin()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.add(waits=0 if idle else 1, wait_time=time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def connection_url():
+    """Build the mssql+pyodbc URL from the DB_* variables in .env."""
+    load_dotenv()
+
+    # Define server and database information
+    server_name = os.getenv('SERVER_NAME', 'default_server')
+    database = os.getenv('DATABASE_NAME', 'default_database')
+    username = os.getenv('DB_USERNAME', 'default_username')
+    password = os.getenv('DB_PASSWORD', 'default_password')
+    driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
+
+    return URL.create('mssql+pyodbc', username=username, password=password,
+                      host=server_name, database=database, query={'driver': driver})
+
+
+def pool_options(**overrides):
+    """Resolve pool settings from ``overrides``, then DB_POOL_* variables."""
+    load_dotenv()
+    options = {}
+    for name, default in POOL_DEFAULTS.items():
+        value = overrides.pop(name, None)
+        if value is None:
+            value = int(os.getenv(f'DB_{name.upper()}', default))
+        options[name] = value
+    options['pool_pre_ping'] = overrides.pop('pool_pre_ping', True)
+    return options, overrides
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _attach_stats(engine, stats):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        stats.add(connects=1)
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.add(checkouts=1)
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.add(reconnects=1)
+
+
+def get_engine(url=None, **options):
+    """Return the process-wide engine for ``url`` (the .env database by default).
+
+    The first call for a URL creates the engine; later calls return it
+    unchanged and ignore ``options``. Pool settings not given in ``options``
+    fall back to DB_POOL_* variables and then POOL_DEFAULTS; anything else
+    is passed to ``create_engine``.
+    """
+    url = make_url(url) if url is not None else connection_url()
+    key = url.render_as_string(hide_password=False)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if _is_memory_sqlite(url):
+                # Every pooled connection would see its own empty database
+                engine = create_engine(url, **options)
+                stats = PoolStats()
+            else:
+                pool, extra = pool_options(**options)
+                engine = create_engine(url, poolclass=InstrumentedQueuePool, **pool, **extra)
+                stats = engine.pool.stats
+            _attach_stats(engine, stats)
+            engine.pool_stats = stats
+            _engines[key] = engine
+        return engine
+
+
+def warm_up(engine, connections=None):
+    """Open up to ``connections`` pooled connections up front.
+
+    Defaults to, and is capped at, the pool size: overflow connections are
+    closed as soon as they are returned, so warming them would be wasted.
+    Each connection runs ``SELECT 1`` so TLS and ODBC login happen before
+    the first load rather than during it. Returns the number opened. If one
+    connection fails, the others stop waiting and its error is raised.
+    """
+    size = engine.pool.size() if hasattr(engine.pool, 'size') else 1
+    connections = size if connections is None else min(connections, size)
+    if connections < 1:
+        return 0
+    barrier = threading.Barrier(connections)
+
+    def open_one():
+        try:
+            # Hold every connection until all are open so none is reused
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+                barrier.wait()
+        except threading.BrokenBarrierError:
+            raise
+        except BaseException:
+            # Release the workers already waiting, or they would wait forever
+            barrier.abort()
+            raise
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(open_one) for _ in range(connections)]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        # Report why a connection failed, not the broken barrier it left behind
+        causes = [error for error in errors if not isinstance(error, threading.BrokenBarrierError)]
+        raise (causes or errors)[0]
+    return connections
+
+
+def pool_stats(engine=None):
+    """Return the pool counters of ``engine`` (the .env engine by default)."""
+    engine = engine if engine is not None else get_engine()
+    return engine.pool_stats.as_dict()
+
+
+def dispose_engines():
+    """Close every pooled connection and forget the shared engines."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
@@ -0,0 +1,61 @@
+# Reader for the CSV dialect used by the course datasets under dbs/.
+#
+# The files quote text with single quotes ('LOGAN'), pad fields and headers
+# with spaces (  '70-TU', "City  ,AirportCode  "), keep trailing blanks inside
+# some quoted values ('Aberdeen ') and escape apostrophes by doubling them
+# ('L''Apres-Midi'). read_dbs_csv lets the C parser handle the quoting and
+# leading blanks, normalizes the header once, and trims what is left in one
+# vectorized pass per text column.
+
+import csv
+
+import pandas
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORY_COLUMNS = frozenset({
+    'Color', 'State', 'bedType', 'decor', 'Country', 'CountryAbbrev', 'isAVA',
+})
+
+DIALECT_OPTIONS = {
+    'quotechar': "'",
+    'skipinitialspace': True,
+    'doublequote': True,
+    # Keep literal values such as 'N/A' as text; only empty fields and
+    # 'NULL' are missing
+    'keep_default_na': False,
+    'na_values': ['', 'NULL'],
+}
+
+
+def read_header(path):
+    """Return the normalized column names of the CSV at ``path``."""
+    with open(path, newline='') as handle:
+        header = next(csv.reader(handle, quotechar="'", skipinitialspace=True))
+    return [name.strip() for name in header]
+
+
+def trim_text(frame, categories=CATEGORY_COLUMNS):
+    """Strip trailing padding from text columns and convert ``categories``."""
+    for column in frame.columns:
+        series = frame[column]
+        if pandas.api.types.is_string_dtype(series) or pandas.api.types.is_object_dtype(series):
+            series = series.str.rstrip()
+            if column in categories:
+                series = series.astype('category')
+            frame[column] = series
+    return frame
+
+
+def read_dbs_csv(path, chunksize=None, categories=CATEGORY_COLUMNS, **options):
+    """Read a dbs/ CSV file into clean, compactly typed DataFrames.
+
+    Returns a DataFrame, or an iterator of DataFrames when ``chunksize`` is
+    given. Extra keyword arguments are passed on to ``pandas.read_csv`` and
+    may use the normalized column names (for example in ``dtype``).
+    """
+    names = read_header(path)
+    reader = pandas.read_csv(path, header=0, names=names, chunksize=chunksize,
+                             **{**DIALECT_OPTIONS, **options})
+    if chunksize is None:
+        return trim_text(reader, categories)
+    return (trim_text(chunk, categories) for chunk in reader)
@@ -0,0 +1,214 @@
+# Incremental re-loads driven by content fingerprints.
+#
+# A local SQLite manifest remembers, per target database and table, the
+# source file's size, mtime and SHA-256, a fingerprint of every block of
+# rows, and one hash per row keyed by the row's primary key. On the next run:
+#
+#   * a file whose size and mtime are unchanged is skipped without being
+#     read; one whose content hash is unchanged is skipped without parsing;
+#   * blocks whose fingerprint is unchanged are skipped without comparing
+#     rows;
+#   * within a changed block, only rows whose primary key is new or whose
+#     row hash differs are sent, through bulk_upsert (MERGE on SQL Server).
+#
+# The manifest only describes the target while nobody else changes it. If
+# the table holds fewer rows than the manifest has sent (it was dropped,
+# re-created or emptied), what it knows about the table is forgotten and
+# every row is sent again; ``full=True`` does the same on request.
+#
+# Rows deleted from a CSV are not deleted from the database.
+
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy
+import pandas
+from sqlalchemy import func, select
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, bulk_upsert, column_keys
+from loaders.csv_dialect import read_dbs_csv
+from loaders.integrity import key_hashes
+
+DEFAULT_MANIFEST = '.load_manifest.db'
+DEFAULT_BLOCK_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    target TEXT, source TEXT, size INTEGER, mtime_ns INTEGER, sha256 TEXT, loaded_at REAL,
+    PRIMARY KEY (target, source)
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    target TEXT, tbl TEXT, block INTEGER, fingerprint TEXT,
+    PRIMARY KEY (target, tbl, block)
+);
+CREATE TABLE IF NOT EXISTS row_hashes (
+    target TEXT, tbl TEXT, key_hash INTEGER, row_hash INTEGER,
+    PRIMARY KEY (target, tbl, key_hash)
+);
+"""
+
+
+def file_digest(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of the file at ``path``."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def target_name(engine):
+    """Identify a target database without its password."""
+    return engine.url.render_as_string(hide_password=True)
+
+
+def _signed(hashes):
+    # SQLite integers are signed 64-bit
+    return numpy.asarray(hashes, dtype='uint64').view('int64')
+
+
+class Manifest:
+    """Fingerprints of what has already been loaded, kept in a SQLite file."""
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def file_state(self, target, source):
+        return self.db.execute(
+            'SELECT size, mtime_ns, sha256 FROM files WHERE target = ? AND source = ?',
+            (target, source)).fetchone()
+
+    def save_file(self, target, source, size, mtime_ns, sha256):
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                        (target, source, size, mtime_ns, sha256, time.time()))
+        self.db.commit()
+
+    def block_fingerprints(self, target, table):
+        return dict(self.db.execute(
+            'SELECT block, fingerprint FROM blocks WHERE target = ? AND tbl = ?', (target, table)))
+
+    def row_count(self, target, table):
+        """Return how many rows of ``table`` the manifest has recorded as sent."""
+        return self.db.execute('SELECT count(*) FROM row_hashes WHERE target = ? AND tbl = ?',
+                               (target, table)).fetchone()[0]
+
+    def row_hashes(self, target, table):
+        """Return the stored row hashes of ``table`` as a Series keyed by key hash."""
+        frame = pandas.read_sql_query(
+            'SELECT key_hash, row_hash FROM row_hashes WHERE target = ? AND tbl = ?',
+            self.db, params=(target, table))
+        return pandas.Series(frame['row_hash'].to_numpy(), index=frame['key_hash'].to_numpy(),
+                             dtype='Int64')
+
+    def save_blocks(self, target, table, blocks, keys, rows):
+        """Record block fingerprints and row hashes after a committed load."""
+        self.db.executemany('INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?)',
+                            [(target, table, block, fingerprint) for block, fingerprint in blocks.items()])
+        self.db.executemany('INSERT OR REPLACE INTO row_hashes VALUES (?, ?, ?, ?)',
+                            zip([target] * len(keys), [table] * len(keys),
+                                _signed(keys).tolist(), _signed(rows).tolist()))
+        self.db.commit()
+
+    def forget(self, target, table=None, source=None):
+        """Drop what the manifest knows, so the next load starts from scratch."""
+        if source is not None:
+            self.db.execute('DELETE FROM files WHERE target = ? AND source = ?', (target, source))
+        if table is not None:
+            self.db.execute('DELETE FROM blocks WHERE target = ? AND tbl = ?', (target, table))
+            self.db.execute('DELETE FROM row_hashes WHERE target = ? AND tbl = ?', (target, table))
+        self.db.commit()
+
+
+def incremental_load(path, model, engine, columns=None, manifest=None, prepare=None,
+                     block_size=DEFAULT_BLOCK_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                     frame=None, full=False):
+    """Upsert only the new or changed rows of the CSV at ``path``.
+
+    ``frame``, if given, holds the rows of ``path`` already read (and
+    checked), and is loaded instead of parsing the file again. ``prepare``,
+    if given, is applied to each block before it is hashed (for example to
+    coerce date strings). ``full=True`` forgets what the manifest knows
+    about the table and sends every row. ``manifest`` defaults to
+    ``Manifest()`` in the current directory. All changed rows go through one
+    transaction on ``engine``; the manifest is only updated after it
+    commits. Returns the number of rows sent, which is 0 when the file (or
+    every block in it) is unchanged.
+    """
+    owns_manifest = manifest is None
+    manifest = manifest or Manifest()
+    try:
+        return _incremental_load(path, model, engine, columns, manifest, prepare,
+                                 block_size, batch_size, frame, full)
+    finally:
+        if owns_manifest:
+            manifest.close()
+
+
+def target_rows(engine, model):
+    """Return the number of rows in ``model``'s table on ``engine``."""
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def _blocks(path, frame, block_size):
+    if frame is None:
+        return read_dbs_csv(path, chunksize=block_size)
+    return (frame.iloc[start:start + block_size] for start in range(0, len(frame), block_size))
+
+
+def _incremental_load(path, model, engine, columns, manifest, prepare, block_size, batch_size,
+                      frame, full):
+    target, table = target_name(engine), model.__tablename__
+    source = os.path.abspath(path)
+    if full or target_rows(engine, model) < manifest.row_count(target, table):
+        manifest.forget(target, table, source)
+    stat = os.stat(path)
+    state = manifest.file_state(target, source)
+    if state is not None and state[:2] == (stat.st_size, stat.st_mtime_ns):
+        return 0
+    sha256 = file_digest(path)
+    if state is not None and state[2] == sha256:
+        manifest.save_file(target, source, stat.st_size, stat.st_mtime_ns, sha256)
+        return 0
+
+    primary_key = [column.key for column in model.__table__.primary_key]
+    old_blocks = manifest.block_fingerprints(target, table)
+    old_rows = None
+    new_blocks, new_keys, new_rows = {}, [], []
+    sent = 0
+
+    with engine.begin() as conn:
+        for number, chunk in enumerate(_blocks(path, frame, block_size)):
+            if prepare is not None:
+                chunk = prepare(chunk)
+            mapping = column_keys(model, chunk, columns)
+            names = {key: name for name, key in mapping.items()}
+            row_hash = key_hashes(chunk, list(mapping))
+            fingerprint = hashlib.sha256(row_hash.tobytes()).hexdigest()
+            if old_blocks.get(number) == fingerprint:
+                continue
+
+            if old_rows is None:
+                old_rows = manifest.row_hashes(target, table)
+            key_hash = _signed(key_hashes(chunk, [names[key] for key in primary_key]))
+            # Keys missing from the manifest compare as NA and count as changed
+            previous = old_rows.reindex(key_hash)
+            changed = (previous != _signed(row_hash)).fillna(True).to_numpy(dtype=bool)
+            if changed.any():
+                sent += bulk_upsert(chunk[changed], model, conn, columns, batch_size)
+            new_blocks[number] = fingerprint
+            new_keys.append(key_hash[changed])
+            new_rows.append(_signed(row_hash)[changed])
+
+    if new_keys:
+        manifest.save_blocks(target, table, new_blocks,
+                             numpy.concatenate(new_keys), numpy.concatenate(new_rows))
+    manifest.save_file(target, source, stat.st_size, stat.st_mtime_ns, sha256)
+    return sent
@@ -0,0 +1,165 @@
+# Key uniqueness and referential integrity checks before a load.
+#
+# Keys are hashed straight from their columns with hash_pandas_object, so
+# single and composite keys become one uint64 per row without building
+# strings such as "18129-1". Each table's key hashes go into a KeyIndex,
+# which later chunks and child tables are checked against with a vectorized
+# binary search. Tables are checked parents first; every foreign key
+# declared in the models is then checked for orphans. Single-column keys of
+# small reference tables are also kept as a dictionary-encoded
+# ReferenceIndex (loaders/reference_index.py), and foreign keys to them are
+# checked by encoding the child column instead of hashing it.
+
+import numpy
+import pandas
+from pandas.util import hash_pandas_object
+
+from loaders.bulk_loader import column_keys
+from loaders.reference_index import REFERENCE_MAX_ROWS, ReferenceIndex
+from loaders.validation import ValidationReport
+
+
+def key_hashes(frame, names):
+    """Return one uint64 hash per row of ``frame[names]``.
+
+    Float columns whose values are all whole numbers are hashed as integers,
+    so a key read as 101.0 (because its column has gaps) matches 101.
+    """
+    keys = frame[list(names)]
+    for name in keys.columns:
+        values = keys[name]
+        if pandas.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            keys = keys.assign(**{name: values.astype('Int64')})
+    return hash_pandas_object(keys, index=False).to_numpy()
+
+
+class KeyIndex:
+    """A growing set of hashed keys for one table's column group."""
+
+    def __init__(self):
+        self._pending = []
+        self._sorted = numpy.empty(0, dtype='uint64')
+
+    def add(self, hashes):
+        self._pending.append(numpy.asarray(hashes, dtype='uint64'))
+
+    def _compact(self):
+        if self._pending:
+            self._sorted = numpy.unique(numpy.concatenate([self._sorted, *self._pending]))
+            self._pending = []
+        return self._sorted
+
+    def contains(self, hashes):
+        """Return a boolean mask of which ``hashes`` are in the index."""
+        index = self._compact()
+        if not len(index):
+            return numpy.zeros(len(hashes), dtype=bool)
+        positions = numpy.searchsorted(index, hashes).clip(max=len(index) - 1)
+        return index[positions] == hashes
+
+    def __len__(self):
+        return len(self._compact())
+
+
+def _referenced_groups(table):
+    # Column groups of ``table`` that foreign keys elsewhere in the metadata point at
+    groups = {tuple(column.key for column in table.primary_key)}
+    for other in table.metadata.tables.values():
+        for constraint in other.foreign_key_constraints:
+            if constraint.referred_table is table:
+                groups.add(tuple(element.column.key for element in constraint.elements))
+    return groups
+
+
+class IntegrityChecker:
+    """Checks primary keys and foreign keys of DataFrames against each other.
+
+    Call ``check`` for parent tables before their children (or chunk by
+    chunk in that order). Each call reports duplicates of the primary key,
+    both within the frame and against earlier chunks of the same table, and
+    orphaned foreign keys against the parent keys seen so far. Foreign keys
+    to tables that have not been checked yet are skipped.
+
+    ``references`` maps (table name, key column) to a ReferenceIndex for
+    tables of up to ``reference_max_rows`` rows, for callers that want the
+    parent codes of a child column.
+    """
+
+    def __init__(self, reference_max_rows=REFERENCE_MAX_ROWS):
+        self.indexes = {}
+        self.references = {}
+        self.reference_max_rows = reference_max_rows
+
+    def index(self, table, keys):
+        return self.indexes.setdefault((table.name, tuple(keys)), KeyIndex())
+
+    def register(self, frame, model, columns=None):
+        """Add ``frame``'s keys to the index without checking anything."""
+        table = model.__table__
+        names = {key: name for name, key in column_keys(model, frame, columns).items()}
+        for keys in _referenced_groups(table):
+            if all(key in names for key in keys):
+                subset = frame[[names[key] for key in keys]].dropna()
+                index = self.index(table, keys)
+                index.add(key_hashes(subset, subset.columns))
+                if len(keys) == 1:
+                    self._add_reference(table, keys[0], subset.iloc[:, 0], index)
+
+    def _add_reference(self, table, key, values, index):
+        reference = self.references.get((table.name, key))
+        if reference is None and (table.name, key) in self.references:
+            return  # the table outgrew the limit; the hashed KeyIndex covers it
+        if len(index) > self.reference_max_rows:
+            self.references[(table.name, key)] = None
+            return
+        if reference is None:
+            self.references[(table.name, key)] = ReferenceIndex(values)
+        else:
+            reference.add(values)
+
+    def reference(self, table_name, key):
+        """Return the ReferenceIndex for ``table_name.key``, or None."""
+        return self.references.get((table_name, key))
+
+    def check(self, frame, model, columns=None):
+        """Check ``frame`` and then register its keys. Returns a ValidationReport."""
+        table = model.__table__
+        report = ValidationReport(table.name, len(frame))
+        names = {key: name for name, key in column_keys(model, frame, columns).items()}
+
+        primary_key = tuple(column.key for column in table.primary_key)
+        if primary_key and all(key in names for key in primary_key):
+            key_names = [names[key] for key in primary_key]
+            hashes = key_hashes(frame, key_names)
+            duplicated = (pandas.Series(hashes).duplicated().to_numpy()
+                          | self.index(table, primary_key).contains(hashes))
+            if duplicated.any():
+                label = ' + '.join(key_names)
+                report.add(label, 'duplicate',
+                           f"Key {label} has {int(duplicated.sum())} duplicate values",
+                           frame.index[duplicated])
+
+        for constraint in table.foreign_key_constraints:
+            parent_keys = tuple(element.column.key for element in constraint.elements)
+            child_keys = [element.parent.key for element in constraint.elements]
+            parent = self.indexes.get((constraint.referred_table.name, parent_keys))
+            if parent is None or not all(key in names for key in child_keys):
+                continue
+            key_names = [names[key] for key in child_keys]
+            # NULL foreign keys reference nothing and are never orphans
+            present = frame[key_names].notna().all(axis=1).to_numpy()
+            orphaned = numpy.zeros(len(frame), dtype=bool)
+            reference = self.reference(constraint.referred_table.name, parent_keys[0])
+            if len(parent_keys) == 1 and reference is not None:
+                orphaned[present] = reference.encode(frame[key_names[0]][present]) < 0
+            else:
+                orphaned[present] = ~parent.contains(key_hashes(frame[present], key_names))
+            if orphaned.any():
+                label = ' + '.join(key_names)
+                target = ', '.join(f"{constraint.referred_table.name}.{key}" for key in parent_keys)
+                report.add(label, 'orphan',
+                           f"Column {label} has {int(orphaned.sum())} values missing from {target}",
+                           frame.index[orphaned])
+
+        self.register(frame, model, columns)
+        return report
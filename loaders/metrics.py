@@ -0,0 +1,217 @@
+# Per-stage timings and per-table metrics for a load, written as JSON.
+#
+# A RunReport collects one span per stage (read, clean, validate, integrity,
+# insert, commit) and table. Each span records its wall time, rows, bytes
+# read, the process's peak RSS when it ended, and, for engines passed to
+# ``attach``, every database round-trip made on its thread with the batch
+# size of each executemany and the time spent waiting for a pooled
+# connection. ``write`` saves the spans, per-table totals and the run's pool
+# counters as JSON:
+#
+#     python -m loaders.catalogue --url staging.db --report run.json
+#
+# ``profile`` names one stage to run under cProfile; the combined profile of
+# every span of that stage is saved next to the report and can be read with
+# ``python -m pstats``.
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+STAGES = ('read', 'clean', 'validate', 'integrity', 'insert', 'commit')
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, or None."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+
+class Span:
+    """One timed stage of one table. Counters can be updated while it runs."""
+
+    def __init__(self, stage, table=None, rows=None, bytes=None):
+        self.stage = stage
+        self.table = table
+        self.rows = rows
+        self.bytes = bytes
+        self.seconds = 0.0
+        self.round_trips = 0
+        self.batch_sizes = []
+        self.pool_wait = 0.0
+        self.peak_rss = None
+
+    def as_dict(self):
+        data = {
+            'stage': self.stage,
+            'table': self.table,
+            'seconds': self.seconds,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'round_trips': self.round_trips,
+            'batch_sizes': self.batch_sizes,
+            'pool_wait': self.pool_wait,
+            'peak_rss': self.peak_rss,
+        }
+        if self.rows and self.seconds:
+            data['rows_per_sec'] = self.rows / self.seconds
+        return data
+
+
+class RunReport:
+    """Collects the spans of one load run.
+
+    ``profile`` is the name of a stage to profile with cProfile, or None.
+    Spans may be opened from several threads; round-trips and pool waits are
+    charged to the innermost span open on the thread that made them.
+    """
+
+    def __init__(self, name='load', profile=None):
+        self.name = name
+        self.profile = profile
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = {}
+        self._profiles = []
+        self._profiling = False
+        self.spans = []
+
+    def attach(self, engine):
+        """Count round-trips and pool waits made through ``engine``."""
+        if engine in self._engines:
+            return engine
+        stats = getattr(engine, 'pool_stats', None)
+        self._engines[engine] = stats.as_dict() if stats is not None else None
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        return engine
+
+    def detach(self):
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        span = self._current()
+        if span is not None:
+            span.round_trips += 1
+            if executemany:
+                span.batch_sizes.append(len(parameters))
+
+    def _current(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def _thread_wait_time(self):
+        return sum(engine.pool_stats.thread_wait_time() for engine in self._engines
+                   if hasattr(engine, 'pool_stats'))
+
+    @contextmanager
+    def stage(self, stage, table=None, rows=None, bytes=None):
+        """Time the body of a ``with`` block as ``stage`` of ``table``."""
+        span = Span(stage, table, rows, bytes)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(span)
+        profiler = None
+        if stage == self.profile:
+            # Only one cProfile profiler may be active at a time
+            with self._lock:
+                if not self._profiling:
+                    self._profiling = True
+                    profiler = cProfile.Profile()
+        waited = self._thread_wait_time()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield span
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            span.seconds = time.perf_counter() - start
+            span.pool_wait = self._thread_wait_time() - waited
+            span.peak_rss = peak_rss()
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+                if profiler is not None:
+                    self._profiles.append(profiler)
+                    self._profiling = False
+
+    def tables(self):
+        """Sum the spans of each table, with seconds broken down by stage."""
+        totals = {}
+        for span in self.spans:
+            if span.table is None:
+                continue
+            total = totals.setdefault(span.table, {
+                'seconds': 0.0, 'stages': {}, 'rows': 0, 'bytes': 0, 'round_trips': 0,
+                'batches': 0, 'max_batch': 0, 'pool_wait': 0.0,
+            })
+            total['seconds'] += span.seconds
+            total['stages'][span.stage] = total['stages'].get(span.stage, 0.0) + span.seconds
+            if span.stage in ('read', 'insert'):
+                total['rows'] = max(total['rows'], span.rows or 0)
+            if span.stage == 'read':
+                total['bytes'] += span.bytes or 0
+            total['round_trips'] += span.round_trips
+            total['batches'] += len(span.batch_sizes)
+            total['max_batch'] = max([total['max_batch'], *span.batch_sizes])
+            total['pool_wait'] += span.pool_wait
+        for total in totals.values():
+            if total['seconds']:
+                total['rows_per_sec'] = total['rows'] / total['seconds']
+        return totals
+
+    def as_dict(self):
+        pools = {}
+        for engine, before in self._engines.items():
+            if before is not None:
+                after = engine.pool_stats.as_dict()
+                pools[engine.url.render_as_string(hide_password=True)] = {
+                    name: after[name] - before[name] for name in after}
+        return {
+            'run': self.name,
+            'started': self.started.isoformat(),
+            'seconds': time.perf_counter() - self._start,
+            'peak_rss': peak_rss(),
+            'profile': self.profile,
+            'tables': self.tables(),
+            'spans': [span.as_dict() for span in self.spans],
+            'pools': pools,
+        }
+
+    def write(self, path):
+        """Write the report to ``path`` as JSON, and any profile to ``path``.prof."""
+        with open(path, 'w') as handle:
+            json.dump(self.as_dict(), handle, indent=2)
+        if self._profiles:
+            pstats.Stats(*self._profiles).dump_stats(f'{os.path.splitext(path)[0]}.prof')
+        return path
+
+
+def stage(report, name, table=None, rows=None, bytes=None):
+    """``report.stage(...)``, or a no-op context when ``report`` is None."""
+    if report is None:
+        return nullcontext(Span(name, table, rows, bytes))
+    return report.stage(name, table, rows, bytes)
@@ -0,0 +1,171 @@
+# Declarative models shared by the setup scripts and the loaders package.
+
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Numeric
+from sqlalchemy.orm import relationship
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+## Test data
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    email = Column(String)
+
+
+## Students
+
+class Student(Base):
+    __tablename__ = 'students'
+    id = Column(Integer, primary_key=True)
+    last_name = Column(String)
+    first_name = Column(String)
+    grade = Column(Integer)
+    classroom_id = Column(Integer, ForeignKey('teachers.classroom_id'))
+
+class Teacher(Base):
+    __tablename__ = 'teachers'
+    classroom_id = Column(Integer, primary_key=True)
+    last_name = Column(String)
+    first_name = Column(String)
+    # The backref 'teacher' creates a virtual column in the Student model, linking each student to their teacher
+    students = relationship("Student", backref="teacher")
+
+
+## Bakery
+
+class Customer(Base):
+    __tablename__ = 'customers'
+    Id = Column(Integer, primary_key=True)
+    LastName = Column(String)
+    FirstName = Column(String)
+
+class Good(Base):
+    __tablename__ = 'goods'
+    Id = Column(String, primary_key=True)
+    Flavor = Column(String)
+    Food = Column(String)
+    Price = Column(Numeric)
+
+class Receipt(Base):
+    __tablename__ = 'receipts'
+    ReceiptNumber = Column(Integer, primary_key=True)
+    Date = Column(Date)
+    CustomerId = Column(Integer, ForeignKey('customers.Id'))
+    customer = relationship("Customer", back_populates="receipts")
+
+class Item(Base):
+    __tablename__ = 'items'
+    Receipt = Column(Integer, ForeignKey('receipts.ReceiptNumber'), primary_key=True)
+    Ordinal = Column(Integer, primary_key=True)
+    Item = Column(String, ForeignKey('goods.Id'))  # Updated data type to String
+    good = relationship("Good", overlaps="items")
+
+# Establishing relationships
+Customer.receipts = relationship("Receipt", order_by=Receipt.ReceiptNumber, back_populates="customer")
+Good.items = relationship("Item", order_by=Item.Ordinal)
+
+
+## Airlines
+
+class Airline(Base):
+    __tablename__ = 'airlines'
+    Id = Column(Integer, primary_key=True)
+    Airline = Column(String)
+    Abbreviation = Column(String)
+    Country = Column(String)
+
+class Airport(Base):
+    __tablename__ = 'airports'
+    City = Column(String)
+    AirportCode = Column(String, primary_key=True)
+    AirportName = Column(String)
+    Country = Column(String)
+    CountryAbbrev = Column(String)
+
+class Flight(Base):
+    __tablename__ = 'flights'
+    # Flight numbers are unique for each airline but may repeat across airlines
+    Airline = Column(Integer, ForeignKey('airlines.Id'), primary_key=True)
+    FlightNo = Column(Integer, primary_key=True)
+    SourceAirport = Column(String, ForeignKey('airports.AirportCode'))
+    DestAirport = Column(String, ForeignKey('airports.AirportCode'))
+
+
+## Wine
+
+class Grape(Base):
+    __tablename__ = 'grapes'
+    ID = Column(Integer, primary_key=True)
+    Grape = Column(String(50), unique=True)
+    Color = Column(String)
+
+class Appellation(Base):
+    __tablename__ = 'appellations'
+    No = Column(Integer, primary_key=True)
+    Appelation = Column(String(100), unique=True)
+    County = Column(String)
+    State = Column(String)
+    Area = Column(String)
+    isAVA = Column(String)
+
+class Wine(Base):
+    __tablename__ = 'wine'
+    No = Column(Integer, primary_key=True)
+    Grape = Column(String(50), ForeignKey('grapes.Grape'))
+    Winery = Column(String)
+    Appelation = Column(String(100), ForeignKey('appellations.Appelation'))
+    State = Column(String)
+    Name = Column(String)
+    Year = Column(Integer)
+    Price = Column(Integer)  # whole US dollars
+    Score = Column(Integer)
+    Cases = Column(Integer)
+    Drink = Column(String)  # 'now' or the year the wine reaches its potential
+
+
+## Reservations
+
+class Room(Base):
+    __tablename__ = 'rooms'
+    RoomId = Column(String, primary_key=True)
+    roomName = Column(String)
+    beds = Column(Integer)
+    bedType = Column(String)
+    maxOccupancy = Column(Integer)
+    basePrice = Column(Integer)
+    decor = Column(String)
+
+class Reservation(Base):
+    __tablename__ = 'reservations'
+    Code = Column(Integer, primary_key=True)
+    Room = Column(String, ForeignKey('rooms.RoomId'))
+    CheckIn = Column(Date)
+    CheckOut = Column(Date)
+    Rate = Column(Numeric(8, 2))
+    LastName = Column(String)
+    FirstName = Column(String)
+    Adults = Column(Integer)
+    Kids = Column(Integer)
+
+
+# Column names used in the CSV files under dbs/, mapped to model attributes
+# where the two differ.
+STUDENT_COLUMNS = {
+    'ID': 'id',
+    'LastName': 'last_name',
+    'FirstName': 'first_name',
+    'Grade': 'grade',
+    'Classroom_ID': 'classroom_id',
+}
+TEACHER_COLUMNS = {
+    'Classroom_ID': 'classroom_id',
+    'LastName': 'last_name',
+    'FirstName': 'first_name',
+}
+RECEIPT_COLUMNS = {
+    'RecieptNumber': 'ReceiptNumber',
+}
@@ -0,0 +1,94 @@
+# Multi-table loading that runs independent tables at the same time.
+#
+# The foreign keys declared in the models define which tables depend on which
+# (items -> receipts/goods, receipts -> customers, students -> teachers).
+# Each table is loaded on a worker thread with its own pooled connection and
+# its own transaction, and a table is only started once every table it
+# references has been committed. Tables with no path between them, such as
+# customers and goods, load side by side.
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE
+from loaders.metrics import stage
+from loaders.server_bulk import server_bulk_insert
+
+
+def table_dependencies(tables):
+    """Map each of ``tables`` to the set of ``tables`` it references.
+
+    Self-references and references to tables outside ``tables`` are ignored.
+    """
+    tables = set(tables)
+    return {
+        table: {fk.column.table for fk in table.foreign_keys
+                if fk.column.table in tables and fk.column.table is not table}
+        for table in tables
+    }
+
+
+def run_in_fk_order(tasks, max_workers=4):
+    """Run ``tasks`` (a dict of Table -> callable) in foreign-key order.
+
+    A task starts once the tasks of every table it references have returned.
+    Up to ``max_workers`` tasks run at the same time. Returns a dict of table
+    name -> task result. If a task raises, tasks that have not started yet
+    are skipped and the first error is re-raised once running tasks finish.
+    """
+    parents = table_dependencies(tasks)
+    done, running = set(), {}
+    results, error = {}, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(done) < len(tasks):
+            if error is None:
+                started = set(running.values())
+                for table in sorted(tasks, key=lambda table: table.name):
+                    if table not in done and table not in started and parents[table] <= done:
+                        running[executor.submit(tasks[table])] = table
+            if not running:
+                if error is not None:
+                    break
+                blocked = sorted(table.name for table in tasks if table not in done)
+                raise ValueError(f"Circular foreign keys between tables: {blocked}")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                try:
+                    results[table.name] = future.result()
+                except Exception as e:
+                    error = error or e
+                done.add(table)
+
+    if error is not None:
+        raise error
+    return results
+
+
+def load_tables(frames, engine, columns=None, max_workers=4, batch_size=DEFAULT_BATCH_SIZE,
+                report=None, strategy='executemany'):
+    """Bulk-insert several DataFrames, running independent tables in parallel.
+
+    ``frames`` maps declarative models to the DataFrames to load and
+    ``columns`` optionally maps models to ``bulk_insert`` column renames.
+    Every table is committed separately. Inserts and commits are timed
+    into ``report`` (a RunReport) if given. ``strategy`` is passed to
+    ``server_bulk_insert``; 'auto' picks a bulk path by table size. Returns
+    a dict of table name -> number of rows inserted.
+    """
+    columns = columns or {}
+
+    def load(model, frame):
+        table = model.__tablename__
+        with engine.connect() as conn:
+            with stage(report, 'insert', table, rows=len(frame)):
+                rows = server_bulk_insert(frame, model, conn, columns.get(model), batch_size, strategy)
+            with stage(report, 'commit', table):
+                conn.commit()
+        return rows
+
+    def task(model, frame):
+        return lambda: load(model, frame)
+
+    tasks = {model.__table__: task(model, frame) for model, frame in frames.items()}
+    return run_in_fk_order(tasks, max_workers)
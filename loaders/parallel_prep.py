@@ -0,0 +1,231 @@
+# Parallel CSV preprocessing across processes for the whole dbs/ catalogue.
+#
+# Parsing the quoted CSVs, trimming padding and parsing dates is CPU-bound
+# and holds the GIL, so threads do not help. prepare_parallel cuts every
+# file into byte ranges of about ``shard_bytes``, ending each range at a
+# line break, and hands all shards of all files to one process pool. Small
+# files are a single shard, so whole files run side by side and large ones
+# are split across cores.
+#
+# Each shard infers its own column types, and the result must match reading
+# the whole file. Shards that guessed numbers for a column another shard
+# holds as text are read again with the column as text, and combine promotes
+# the rest the way read_csv would (an integer column with a gap is float).
+#
+# A worker writes its cleaned shard as an uncompressed Arrow file under
+# /dev/shm (the system temp directory where there is no /dev/shm) and
+# returns only the path. The parent memory-maps each file instead of
+# unpickling a DataFrame, and concatenates the shards in file order.
+# Decimals are converted in the parent, once per distinct value of the whole
+# column: Decimal objects are slow to move through Arrow, and a shard alone
+# cannot tell which scale the column needs. Validation and key checks also
+# run in the parent on whole tables, since duplicates and orphans can only
+# be found with every shard in view.
+#
+# The dbs/ files never quote line breaks, which is what makes a plain line
+# break a safe place to split. Without pyarrow the shards come back pickled.
+#
+#     python -m loaders.parallel_prep --processes 4      # check every dataset
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas
+
+from loaders import columnar_cache
+from loaders.catalogue import DATASETS, coerce, in_fk_order
+from loaders.coercion import parse_dates
+from loaders.csv_dialect import CATEGORY_COLUMNS, DIALECT_OPTIONS, read_header, trim_text
+from loaders.integrity import IntegrityChecker
+from loaders.validation import validate_frame
+
+DEFAULT_SHARD_BYTES = 8 * 1024 * 1024
+
+
+def shared_dir():
+    """Directory for shard files: RAM-backed /dev/shm where there is one."""
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def byte_ranges(path, shard_bytes=DEFAULT_SHARD_BYTES):
+    """Split the CSV at ``path`` after its header into (start, end) byte ranges.
+
+    Every range ends at a line break (or the end of the file).
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as handle:
+        handle.readline()
+        start = handle.tell()
+        while start < size:
+            handle.seek(min(start + shard_bytes, size))
+            handle.readline()
+            end = handle.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def prepare_shard(spec, start, end, names, directory, dtype=None):
+    """Parse, trim and parse the dates of bytes ``start:end`` of ``spec.file``.
+
+    ``dtype`` is passed to read_csv. Returns the path of the Arrow file
+    holding the result, or the DataFrame itself when pyarrow is missing.
+    """
+    with open(spec.file, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    frame = pandas.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtype, **DIALECT_OPTIONS)
+    frame = trim_text(frame)
+    for name, date_format in (spec.dates or {}).items():
+        if name in frame:
+            frame[name] = parse_dates(frame[name], date_format)
+    if not columnar_cache.available():
+        return frame
+    path = os.path.join(directory, f'loaders-shard-{uuid.uuid4().hex}.arrow')
+    columnar_cache.write_cached(frame, path)
+    return path
+
+
+def _collect(result):
+    if isinstance(result, pandas.DataFrame):
+        return result
+    try:
+        return columnar_cache.read_cached(result)
+    finally:
+        os.remove(result)
+
+
+def _is_text(series):
+    # trim_text only makes categories out of text
+    return (pandas.api.types.is_string_dtype(series) or pandas.api.types.is_object_dtype(series)
+            or isinstance(series.dtype, pandas.CategoricalDtype))
+
+
+def mixed_columns(shards):
+    """Columns that some shards hold as text and others parsed as values."""
+    return [column for column in shards[0].columns
+            if len({_is_text(shard[column]) for shard in shards if shard[column].notna().any()}) > 1]
+
+
+def combine(shards):
+    """Concatenate shard frames, reconciling the dtypes each shard inferred.
+
+    Columns must already be text in every shard or in none (see mixed_columns).
+    """
+    if len(shards) == 1:
+        return shards[0]
+    shards = [shard for shard in shards if len(shard)] or shards[:1]
+    for column in shards[0].columns:
+        # A shard where a column is all NULL infers float64 for it. That is
+        # already right next to integers or booleans, which read_csv would
+        # also turn into float (or object) because of the gap.
+        typed = [shard[column].dtype for shard in shards if shard[column].notna().any()]
+        if not typed or any(dtype.kind in 'iub' for dtype in typed):
+            continue
+        for shard in shards:
+            if not shard[column].notna().any():
+                shard[column] = shard[column].astype(typed[0])
+    frame = pandas.concat(shards, ignore_index=True)
+    # Shards pick their own categories, and mismatched categoricals concatenate to text
+    for column in frame.columns:
+        if column in CATEGORY_COLUMNS and not isinstance(frame[column].dtype, pandas.CategoricalDtype):
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def prepare_parallel(specs, processes=None, shard_bytes=DEFAULT_SHARD_BYTES):
+    """Read, trim and coerce the tables of ``specs`` in a process pool.
+
+    Returns a dict of model -> DataFrame, in the order of ``specs``.
+    ``processes`` defaults to the number of CPUs.
+    """
+    directory = shared_dir()
+    ranges = {spec.model: byte_ranges(spec.file, shard_bytes) for spec in specs}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {
+            spec.model: [pool.submit(prepare_shard, spec, start, end, read_header(spec.file), directory)
+                         for start, end in ranges[spec.model]]
+            for spec in specs
+        }
+        frames = {}
+        try:
+            for spec in specs:
+                shards = [_collect(future.result()) for future in futures[spec.model]]
+                text = mixed_columns(shards)
+                if text:
+                    again = {index: pool.submit(prepare_shard, spec, *ranges[spec.model][index],
+                                                read_header(spec.file), directory, dict.fromkeys(text, str))
+                             for index, shard in enumerate(shards)
+                             if any(shard[column].notna().any() and not _is_text(shard[column])
+                                    for column in text)}
+                    # Listed so that the cleanup below finds them too
+                    futures[spec.model].extend(again.values())
+                    for index, future in again.items():
+                        shards[index] = _collect(future.result())
+                frame = combine(shards)
+                # Dates are already parsed, so this only converts decimals
+                frames[spec.model] = coerce(frame, spec)[0]
+        except BaseException:
+            # Remove the shard files nothing will collect now
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in (future for shard_futures in futures.values() for future in shard_futures):
+                if future.cancelled() or future.exception() is not None:
+                    continue
+                if isinstance(future.result(), str) and os.path.exists(future.result()):
+                    os.remove(future.result())
+            raise
+    return frames
+
+
+def prepare_catalogue(names=None, processes=None, shard_bytes=DEFAULT_SHARD_BYTES):
+    """Prepare every dataset in ``names`` (default: all) through one process pool.
+
+    Returns a dict of dataset name -> (model -> DataFrame), with None for a
+    dataset that failed validation or key checks after printing its issues,
+    the same as catalogue.prepare_dataset.
+    """
+    names = names or list(DATASETS)
+    specs = [spec for name in names for spec in DATASETS[name]]
+    frames = prepare_parallel(specs, processes, shard_bytes)
+    results = {}
+    for name in names:
+        checker = IntegrityChecker()
+        issues_found = False
+        for spec in in_fk_order(DATASETS[name]):
+            frame = frames[spec.model]
+            validation = validate_frame(frame, spec.model, spec.columns)
+            integrity = checker.check(frame, spec.model, spec.columns)
+            for message in validation.messages() + integrity.messages():
+                print(f"{name}: {message}")
+                issues_found = True
+        results[name] = None if issues_found else {spec.model: frames[spec.model] for spec in DATASETS[name]}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read and check datasets in parallel processes.")
+    parser.add_argument('datasets', nargs='*', metavar='dataset',
+                        help=f"datasets to check (default: all of {', '.join(DATASETS)})")
+    parser.add_argument('--processes', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_BYTES / 2 ** 20,
+                        help="approximate size of each file shard in MiB")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+
+    results = prepare_catalogue(args.datasets or None, args.processes, int(args.shard_mb * 2 ** 20))
+    for name, frames in results.items():
+        for model, frame in (frames or {}).items():
+            print(f"{name}: {model.__tablename__} - {len(frame)} rows valid.")
+    return 0 if all(frames is not None for frames in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
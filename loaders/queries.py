@@ -0,0 +1,257 @@
+# Read-side lookups over the loaded datasets, batched and cached.
+#
+# Walking a lazy relationship such as Customer.receipts runs one query per
+# parent. QueryLayer answers the common lookups for many keys at once
+# instead: receipts by customer, items by receipt (with each item's Good
+# joined in), flights by airport pair and wines by appellation. Each lookup
+# is a select() built once at import with an expanding IN parameter, so the
+# engine's compiled-statement cache hits on every call whatever the number
+# of keys, and pyodbc sends the same parameterized text, which SQL Server
+# keeps as one cached plan.
+#
+# Results are kept per key in a ResultCache, an in-process LRU with a TTL.
+# Only the keys missing from it go to the database, LOOKUP_CHUNK keys per
+# query to stay under SQL Server's 2100-parameter limit. The cache
+# listens on the engine, and any INSERT, UPDATE, DELETE or MERGE that reaches
+# a table through that engine (the loaders all share the one from
+# get_engine) drops the cached lookups reading that table. Loads that
+# bypass the engine, such as bcp, call tables_written themselves.
+#
+# Cached results are detached ORM objects shared between callers. Treat
+# them as read-only, and only use relationships the lookup loaded eagerly.
+
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from loaders.models import Customer, Flight, Item, Receipt, Wine
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 300  # seconds
+# Keys per query; SQL Server takes at most 2100 parameters (as in checkpoint.py)
+LOOKUP_CHUNK = 1000
+
+# The table a data-changing statement writes to, with any schema and quoting
+WRITE_STATEMENT = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM|MERGE(?:\s+INTO)?|TRUNCATE\s+TABLE)\s+'
+    r'(?:[\[\]"`\w]+\.)*[\[\"`]?(\w+)',
+    re.IGNORECASE)
+
+# statement: select() with a ``keys`` expanding parameter
+# key: maps one result object to the key it answers
+# tables: tables the result reads, for invalidation
+Lookup = namedtuple('Lookup', 'statement key tables')
+
+LOOKUPS = {
+    'receipts_by_customer': Lookup(
+        select(Receipt)
+        .where(Receipt.CustomerId.in_(bindparam('keys', expanding=True)))
+        .order_by(Receipt.ReceiptNumber),
+        lambda receipt: receipt.CustomerId,
+        ('receipts',)),
+    'customers': Lookup(
+        # Customer.receipts arrives in one extra SELECT ... IN for the whole batch
+        select(Customer)
+        .where(Customer.Id.in_(bindparam('keys', expanding=True)))
+        .options(selectinload(Customer.receipts)),
+        lambda customer: customer.Id,
+        ('customers', 'receipts')),
+    'items_by_receipt': Lookup(
+        select(Item)
+        .where(Item.Receipt.in_(bindparam('keys', expanding=True)))
+        .options(joinedload(Item.good))
+        .order_by(Item.Receipt, Item.Ordinal),
+        lambda item: item.Receipt,
+        ('items', 'goods')),
+    'wines_by_appellation': Lookup(
+        select(Wine)
+        .where(Wine.Appelation.in_(bindparam('keys', expanding=True)))
+        .order_by(Wine.No),
+        lambda wine: wine.Appelation,
+        ('wine',)),
+    # Keys are (source, destination) pairs. SQL Server has no tuple IN, so
+    # both codes are matched separately and stray pairs dropped afterwards.
+    'flights_between': Lookup(
+        select(Flight)
+        .where(Flight.SourceAirport.in_(bindparam('sources', expanding=True)),
+               Flight.DestAirport.in_(bindparam('destinations', expanding=True)))
+        .order_by(Flight.Airline, Flight.FlightNo),
+        lambda flight: (flight.SourceAirport, flight.DestAirport),
+        ('flights',)),
+}
+
+# Caches watching each engine, for tables_written
+_watchers = weakref.WeakKeyDictionary()
+
+
+def written_table(statement):
+    """Return the table a data-changing SQL statement writes to, or None."""
+    match = WRITE_STATEMENT.match(statement)
+    return match.group(1) if match else None
+
+
+def tables_written(engine, *tables):
+    """Tell every cache watching ``engine`` that ``tables`` changed."""
+    for cache in list(_watchers.get(engine, ())):
+        cache.invalidate(*tables)
+
+
+def _listen(engine):
+    # Invalidate once when a write runs, and again when it commits: a reader
+    # on another connection may have cached the old rows in between
+    @event.listens_for(engine, 'after_cursor_execute')
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        table = written_table(statement)
+        if table is not None:
+            conn.info.setdefault('tables_written', set()).add(table)
+            tables_written(engine, table)
+
+    @event.listens_for(engine, 'commit')
+    def on_commit(conn):
+        tables = conn.info.pop('tables_written', ())
+        if tables:
+            tables_written(engine, *tables)
+
+    @event.listens_for(engine, 'rollback')
+    def on_rollback(conn):
+        conn.info.pop('tables_written', None)
+
+
+class ResultCache:
+    """Thread-safe LRU of lookup results that expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a query that was running while
+        # its tables changed does not cache what it read
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def put(self, key, value, tables, generation=None):
+        """Cache ``value``, unless the cache was invalidated since ``generation``."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tables), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tables):
+        """Drop entries that read any of ``tables``, or every entry if none given."""
+        with self._lock:
+            self.generation += 1
+            if not tables:
+                self._entries.clear()
+                return
+            tables = {table.lower() for table in tables}
+            for key in [key for key, entry in self._entries.items()
+                        if any(table.lower() in tables for table in entry[1])]:
+                del self._entries[key]
+
+    def watch(self, engine):
+        """Invalidate on every write through ``engine``. Returns the cache."""
+        if engine not in _watchers:
+            _watchers[engine] = weakref.WeakSet()
+            _listen(engine)
+        _watchers[engine].add(self)
+        return self
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryLayer:
+    """Batched, cached lookups against ``engine``.
+
+    Each lookup method takes any number of keys and returns a dict of key
+    -> list of results, with an empty list for keys that match nothing.
+    Pass ``cache=None`` to always query the database.
+    """
+
+    def __init__(self, engine, cache=True):
+        self.engine = engine
+        if cache is True:
+            cache = ResultCache()
+        self.cache = cache.watch(engine) if cache is not None else None
+
+    def _query(self, name, keys):
+        lookup = LOOKUPS[name]
+        # An airport pair takes two parameters
+        size = LOOKUP_CHUNK // 2 if name == 'flights_between' else LOOKUP_CHUNK
+        found = {key: [] for key in keys}
+        with Session(self.engine, expire_on_commit=False) as session:
+            for start in range(0, len(keys), size):
+                chunk = keys[start:start + size]
+                if name == 'flights_between':
+                    params = {'sources': sorted({key[0] for key in chunk}),
+                              'destinations': sorted({key[1] for key in chunk})}
+                else:
+                    params = {'keys': list(chunk)}
+                # A stray pair may belong to another chunk, which finds it too
+                wanted = set(chunk)
+                for row in session.scalars(lookup.statement, params).unique():
+                    key = lookup.key(row)
+                    if key in wanted:
+                        found[key].append(row)
+        return found
+
+    def fetch(self, name, keys):
+        """Run lookup ``name`` for ``keys``, querying only keys not cached."""
+        keys = list(dict.fromkeys(keys))
+        if self.cache is None:
+            return self._query(name, keys) if keys else {}
+        results, missing = {}, []
+        for key in keys:
+            hit, value = self.cache.get((name, key))
+            if hit:
+                results[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            generation = self.cache.generation
+            fetched = self._query(name, missing)
+            tables = LOOKUPS[name].tables
+            for key, value in fetched.items():
+                self.cache.put((name, key), value, tables, generation)
+            results.update(fetched)
+        return {key: results[key] for key in keys}
+
+    def receipts_by_customer(self, *customer_ids):
+        return self.fetch('receipts_by_customer', customer_ids)
+
+    def customers(self, *customer_ids):
+        """Customers with their receipts loaded, one result per id found."""
+        return self.fetch('customers', customer_ids)
+
+    def items_by_receipt(self, *receipt_numbers):
+        return self.fetch('items_by_receipt', receipt_numbers)
+
+    def flights_between(self, *pairs):
+        """Flights for each (source, destination) airport code pair."""
+        return self.fetch('flights_between', [tuple(pair) for pair in pairs])
+
+    def wines_by_appellation(self, *appellations):
+        return self.fetch('wines_by_appellation', appellations)
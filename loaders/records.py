@@ -0,0 +1,128 @@
+# Compact row records for loading without the ORM session.
+#
+# An ORM instance carries instrumentation and an identity-map entry, and a
+# session holds every pending one until the commit. A row dict is lighter
+# but still a hash table per row. Here rows are plain tuples instead:
+#
+#   * record_type(model) is a namedtuple class with one field per column of
+#     the model's table, built once per model from the same metadata. A
+#     record costs a tuple: 8 bytes per field on top of the values.
+#   * RowBatch keeps a DataFrame's columns as they are and only builds
+#     tuples a batch at a time while inserting, so nothing per row is held
+#     while a load waits.
+#
+# insert_records sends either to the table with the driver's executemany
+# and a positional INSERT compiled once, so no dict is built per row. The
+# column types' bind processors still run (dates become ISO text on SQLite,
+# for example), and pyodbc's fast_executemany is switched on as it is for
+# bulk_insert. The driver-level statement bypasses SQLAlchemy's own
+# IDENTITY_INSERT handling on SQL Server, so it is switched on around the
+# batches here. The ORM classes are untouched and stay the way to query.
+
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, column_keys, enable_fast_executemany, identity_insert
+
+
+@lru_cache(maxsize=None)
+def record_type(model):
+    """Return the namedtuple class for rows of ``model``, in table column order."""
+    keys = [column.key for column in model.__table__.columns]
+    # rename=True turns keys that are not identifiers into _0, _1, ...
+    return namedtuple(f'{model.__name__}Record', keys, rename=True)
+
+
+def make_record(model, **values):
+    """Build one record of ``model``; columns not given are None."""
+    fields = record_type(model)._fields
+    keys = [column.key for column in model.__table__.columns]
+    return record_type(model)(**{field: values.get(key) for field, key in zip(fields, keys)})
+
+
+def _plain(series):
+    # Python values with None for every kind of missing value
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+class RowBatch:
+    """Column-oriented rows of one model, turned into tuples a batch at a time."""
+
+    def __init__(self, model, keys, columns):
+        self.model = model
+        self.keys = list(keys)
+        self.columns = list(columns)
+
+    @classmethod
+    def from_frame(cls, frame, model, columns=None):
+        """Wrap ``frame``'s model columns without copying them."""
+        mapping = column_keys(model, frame, columns)
+        return cls(model, mapping.values(), [frame[name] for name in mapping])
+
+    def rows(self, start, stop):
+        """Return rows ``start:stop`` as a list of tuples in ``keys`` order."""
+        return list(zip(*(_plain(column.iloc[start:stop]) for column in self.columns)))
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+
+def _statement(table, keys, dialect):
+    # The INSERT text and the key each positional parameter takes, or None
+    # for named parameter styles
+    compiled = insert(table).compile(dialect=dialect, column_keys=list(keys))
+    return str(compiled), compiled.positiontup
+
+
+def _processors(table, keys, dialect):
+    processors = [table.c[key].type.dialect_impl(dialect).bind_processor(dialect) for key in keys]
+    return processors if any(processors) else None
+
+
+def _batches(records, keys, batch_size):
+    if isinstance(records, RowBatch):
+        for start in range(0, len(records), batch_size):
+            yield records.rows(start, start + batch_size)
+        return
+    records = iter(records)
+    while batch := list(itertools.islice(records, batch_size)):
+        yield batch
+
+
+def insert_records(records, model, bind, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert ``records`` into ``model``'s table without an ORM session.
+
+    ``records`` is a RowBatch, or an iterable of ``record_type(model)``
+    tuples. ``bind`` is an Engine (committed here) or a Connection (left to
+    the caller). Returns the number of rows sent.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return insert_records(records, model, conn, batch_size)
+    table = model.__table__
+    keys = records.keys if isinstance(records, RowBatch) else [column.key for column in table.columns]
+    enable_fast_executemany(bind.engine)
+    statement, order = _statement(table, keys, bind.dialect)
+    processors = _processors(table, keys, bind.dialect)
+    # Reorder only if the compiled parameters do not follow ``keys``
+    positions = None
+    if order and order != keys:
+        positions = [keys.index(key) for key in order]
+    total = 0
+    with identity_insert(bind, table, keys):
+        for batch in _batches(records, keys, batch_size):
+            if processors is not None:
+                batch = [tuple(value if process is None or value is None else process(value)
+                               for process, value in zip(processors, row)) for row in batch]
+            if order is None:
+                # Named parameter styles need a mapping per row after all
+                batch = [dict(zip(keys, row)) for row in batch]
+            elif positions is not None:
+                batch = [tuple(row[position] for position in positions) for row in batch]
+            bind.exec_driver_sql(statement, batch)
+            total += len(batch)
+    return total
@@ -0,0 +1,93 @@
+# Dictionary-encoded indexes of small reference tables.
+#
+# Parent tables such as goods (40 rows), rooms (10), airports, grapes and
+# appellations are consulted by every row of their child tables. A
+# ReferenceIndex keeps one such table's key column as a pandas Index, in
+# first-seen order, and turns a child's foreign-key column into integer
+# codes with one vectorized hash lookup: code i is the i-th parent key and
+# -1 means NULL or no parent. Codes use the smallest integer type that fits,
+# one byte per row for anything under 128 parents, so a million-row child
+# column shrinks from a million Python strings to a megabyte of codes.
+#
+# IntegrityChecker keeps one for every single-column key of a table with up
+# to REFERENCE_MAX_ROWS rows and checks foreign keys against it. The codes
+# also index straight into the parent's other columns (``take``), which
+# joins a reference table onto its children without a merge. The models
+# still declare the natural keys, so the database is sent the key values,
+# not the codes.
+
+import numpy
+import pandas
+
+REFERENCE_MAX_ROWS = 10000
+
+CODE_DTYPES = (numpy.int8, numpy.int16, numpy.int32, numpy.int64)
+
+
+def code_dtype(size):
+    """Smallest signed integer type holding codes 0..size-1 and -1."""
+    for dtype in CODE_DTYPES:
+        if size - 1 <= numpy.iinfo(dtype).max:
+            return numpy.dtype(dtype)
+    raise OverflowError(f"{size} keys do not fit in int64 codes")
+
+
+def _normalized(values):
+    # The same rule as integrity.key_hashes: whole-number floats (a column
+    # read with gaps) compare as integers
+    values = pandas.Series(values)
+    if pandas.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        return values.astype('Int64')
+    return values
+
+
+class ReferenceIndex:
+    """Dictionary encoding of one reference table's key column."""
+
+    def __init__(self, values=()):
+        self.keys = pandas.Index([])
+        self.add(values)
+
+    def add(self, values):
+        """Append keys not seen yet. Codes already handed out stay valid."""
+        new = pandas.Index(_normalized(values).dropna().unique())
+        self.keys = self.keys.append(new[~new.isin(self.keys)]) if len(self.keys) else new
+        self.dtype = code_dtype(max(len(self.keys), 1))
+        return self
+
+    def encode(self, values):
+        """Return the code of each of ``values``: -1 for NULL or a missing parent."""
+        return self.keys.get_indexer(_normalized(values)).astype(self.dtype)
+
+    def contains(self, values):
+        """Boolean mask of which ``values`` have a parent."""
+        return self.encode(values) >= 0
+
+    def decode(self, codes):
+        """Return the key for each code, with None for -1."""
+        codes = numpy.asarray(codes)
+        values = self.keys.take(codes.clip(min=0)).to_numpy(dtype=object)
+        values[codes < 0] = None
+        return values
+
+    def categorical(self, values):
+        """Return ``values`` as a Categorical sharing this index's dictionary."""
+        return pandas.Categorical.from_codes(self.encode(values), categories=self.keys)
+
+    def join(self, codes, parent, key):
+        """Return the rows of ``parent`` for each code, all NA where the code is -1.
+
+        ``parent`` is the reference table's frame and ``key`` its key column.
+        """
+        codes = numpy.asarray(codes)
+        positions = pandas.Index(_normalized(parent[key])).get_indexer(self.keys)[codes.clip(min=0)]
+        positions[codes < 0] = -1
+        rows = parent.iloc[positions.clip(min=0)].reset_index(drop=True)
+        return rows.mask(pandas.Series(positions < 0), axis=0)
+
+    @property
+    def nbytes(self):
+        return self.keys.memory_usage(deep=True)
+
+    def __len__(self):
+        return len(self.keys)
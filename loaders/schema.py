@@ -0,0 +1,285 @@
+# Schema bootstrap from one cached reflection of the target catalogue.
+#
+# Base.metadata.create_all checks every table with its own round-trip on
+# each run. SchemaManager instead reflects the columns, indexes and foreign
+# keys of the whole target in one batched pass (SQLAlchemy's get_multi_*
+# calls, one catalogue query each on SQL Server), caches the result in a
+# local JSON file, and diffs the declarative models against it. Only the
+# missing DDL is run: new tables, new columns, new indexes and foreign keys.
+# Columns whose type or nullability differ are reported, never altered.
+# Before sync trusts a cached reflection, one query lists the target's
+# tables, so a table dropped since the cache was written is created again.
+#
+# bulk_load_mode drops the secondary indexes and foreign keys of the tables
+# being loaded and re-creates them afterwards, so each row is not checked
+# and indexed one at a time during a large insert. SQLite cannot drop a
+# foreign key in place, so there only indexes are dropped.
+#
+#     python -m loaders.schema --url staging.db          # show the DDL needed
+#     python -m loaders.schema --url staging.db --apply  # and run it
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import Column, ForeignKeyConstraint, Index, MetaData, Table, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex, CreateTable, DropIndex
+from sqlalchemy.types import NullType
+
+from loaders.incremental import target_name
+from loaders.models import Base
+
+DEFAULT_SCHEMA_CACHE = '.schema_cache.json'
+# Reflect again after this many seconds, in case the schema changed elsewhere
+DEFAULT_MAX_AGE = 3600
+
+SchemaChange = namedtuple('SchemaChange', 'kind table name ddl')
+
+
+def reflect_catalogue(engine):
+    """Reflect every table's columns, indexes and foreign keys in batched calls."""
+    inspector = inspect(engine)
+    catalogue = {}
+    for (schema, table), columns in inspector.get_multi_columns().items():
+        catalogue[table] = {
+            'columns': {column['name']: {'type': str(column['type']), 'nullable': column['nullable']}
+                        for column in columns},
+            'indexes': [],
+            'foreign_keys': [],
+        }
+    for (schema, table), indexes in inspector.get_multi_indexes().items():
+        catalogue[table]['indexes'] = [
+            {'name': index['name'], 'columns': index['column_names'], 'unique': bool(index['unique'])}
+            for index in indexes if index['name'] and all(index['column_names'])]
+    for (schema, table), foreign_keys in inspector.get_multi_foreign_keys().items():
+        catalogue[table]['foreign_keys'] = [
+            {'name': fk['name'], 'columns': fk['constrained_columns'],
+             'referred_table': fk['referred_table'], 'referred_columns': fk['referred_columns']}
+            for fk in foreign_keys]
+    return catalogue
+
+
+def _shadow_table(metadata, name, columns):
+    # A stand-in Table so DDL constructs can be compiled without touching the models
+    if name in metadata.tables:
+        return metadata.tables[name]
+    return Table(name, metadata, *(Column(column, NullType()) for column in columns))
+
+
+class SchemaManager:
+    """Diffs the declarative models against a cached reflection of ``engine``."""
+
+    def __init__(self, engine, cache_path=DEFAULT_SCHEMA_CACHE, max_age=DEFAULT_MAX_AGE):
+        self.engine = engine
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.target = target_name(engine)
+        self._catalogue = None
+
+    def _read_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path) as handle:
+            return json.load(handle)
+
+    def _write_cache(self, catalogue):
+        cache = self._read_cache()
+        if catalogue is None:
+            cache.pop(self.target, None)
+        else:
+            cache[self.target] = {'reflected_at': time.time(), 'tables': catalogue}
+        partial = f'{self.cache_path}.partial'
+        with open(partial, 'w') as handle:
+            json.dump(cache, handle, indent=1)
+        os.replace(partial, self.cache_path)
+
+    def catalogue(self, refresh=False):
+        """Return the reflected tables of the target, from the cache when fresh."""
+        if self._catalogue is not None and not refresh:
+            return self._catalogue
+        entry = None if refresh else self._read_cache().get(self.target)
+        if entry is not None and time.time() - entry['reflected_at'] < self.max_age:
+            self._catalogue = entry['tables']
+        else:
+            self._catalogue = reflect_catalogue(self.engine)
+            self._write_cache(self._catalogue)
+        return self._catalogue
+
+    def invalidate(self):
+        """Forget the reflection, so the next call reflects the target again."""
+        self._catalogue = None
+        self._write_cache(None)
+
+    def table_names(self, refresh=False):
+        return sorted(self.catalogue(refresh))
+
+    def diff(self, tables=None):
+        """Return the SchemaChanges that bring the target up to the models.
+
+        ``tables`` defaults to every model table. Changes are in dependency
+        order, so they can be applied as listed. Column type or nullability
+        differences come back with ``ddl`` set to None.
+        """
+        tables = tables if tables is not None else Base.metadata.sorted_tables
+        tables = [table for table in Base.metadata.sorted_tables if table in set(tables)]
+        catalogue = self.catalogue()
+        dialect = self.engine.dialect
+        preparer = dialect.identifier_preparer
+        changes = []
+        for table in tables:
+            existing = catalogue.get(table.name)
+            if existing is None:
+                changes.append(SchemaChange('create table', table.name, table.name, CreateTable(table)))
+                continue
+            for column in table.columns:
+                reflected = existing['columns'].get(column.name)
+                if reflected is None:
+                    ddl = text(f"ALTER TABLE {preparer.format_table(table)} "
+                               f"ADD {CreateColumn(column).compile(dialect=dialect)}")
+                    changes.append(SchemaChange('add column', table.name, column.name, ddl))
+                elif not column.primary_key and reflected['nullable'] != column.nullable:
+                    changes.append(SchemaChange('nullability differs', table.name, column.name, None))
+            index_columns = {tuple(index['columns']) for index in existing['indexes']}
+            for index in table.indexes:
+                if tuple(column.name for column in index.columns) not in index_columns:
+                    changes.append(SchemaChange('create index', table.name, index.name, CreateIndex(index)))
+            foreign_keys = {(tuple(fk['columns']), fk['referred_table']) for fk in existing['foreign_keys']}
+            for constraint in table.foreign_key_constraints:
+                columns = [column.name for column in constraint.columns]
+                if (tuple(columns), constraint.referred_table.name) in foreign_keys:
+                    continue
+                # SQLite can only declare foreign keys in CREATE TABLE
+                ddl = None if dialect.name == 'sqlite' else AddConstraint(constraint)
+                changes.append(SchemaChange('add foreign key', table.name,
+                                            constraint.name or ', '.join(columns), ddl))
+        return changes
+
+    def apply(self, changes):
+        """Run the DDL of ``changes`` in one transaction. Returns the changes run."""
+        applied = [change for change in changes if change.ddl is not None]
+        if applied:
+            with self.engine.begin() as conn:
+                for change in applied:
+                    conn.execute(change.ddl)
+            self.invalidate()
+        return applied
+
+    def missing_tables(self, tables=None):
+        """Names of ``tables`` the cached reflection lists but the target no longer has."""
+        tables = tables if tables is not None else Base.metadata.sorted_tables
+        cached = [table.name for table in tables if table.name in self.catalogue()]
+        if not cached:
+            return []
+        present = set(inspect(self.engine).get_table_names())
+        return [name for name in cached if name not in present]
+
+    def sync(self, tables=None):
+        """Create or extend ``tables`` as needed. Returns the changes run.
+
+        A cached reflection that lists tables the target has lost (dropped,
+        or a deleted SQLite file) is refreshed first. If the DDL still fails
+        because the reflection was out of date, the target is reflected
+        again and the diff retried once.
+        """
+        if self.missing_tables(tables):
+            self.catalogue(refresh=True)
+        try:
+            return self.apply(self.diff(tables))
+        except DBAPIError:
+            self.catalogue(refresh=True)
+            return self.apply(self.diff(tables))
+
+    @contextmanager
+    def bulk_load_mode(self, tables):
+        """Drop secondary indexes and foreign keys of ``tables`` for a bulk load.
+
+        Everything dropped is re-created when the block exits, even if the
+        load failed. Unique indexes are kept, since foreign keys and
+        duplicate checks rely on them.
+        """
+        names = {getattr(table, 'name', table) for table in tables}
+        catalogue = self.catalogue()
+        dialect = self.engine.dialect
+        preparer = dialect.identifier_preparer
+        metadata = MetaData()
+        drops, creates = [], []
+        for name in sorted(names & set(catalogue)):
+            reflected = catalogue[name]
+            shadow = _shadow_table(metadata, name, reflected['columns'])
+            quoted = preparer.quote(name)
+            for index in reflected['indexes']:
+                if index['unique']:
+                    continue
+                shadow_index = Index(index['name'], *(shadow.c[column] for column in index['columns']))
+                drops.append(DropIndex(shadow_index))
+                creates.append(CreateIndex(shadow_index))
+            if dialect.name == 'sqlite':
+                continue
+            for fk in reflected['foreign_keys']:
+                if not fk['name']:
+                    continue
+                referred = catalogue[fk['referred_table']]['columns']
+                _shadow_table(metadata, fk['referred_table'], referred)
+                constraint = ForeignKeyConstraint(
+                    fk['columns'], [f"{fk['referred_table']}.{column}" for column in fk['referred_columns']],
+                    name=fk['name'])
+                shadow.append_constraint(constraint)
+                drops.insert(0, text(f"ALTER TABLE {quoted} DROP CONSTRAINT {preparer.quote(fk['name'])}"))
+                creates.append(AddConstraint(constraint))
+
+        with self.engine.begin() as conn:
+            for ddl in drops:
+                conn.execute(ddl)
+        try:
+            yield [str(ddl.compile(dialect=dialect)).strip() for ddl in drops]
+        finally:
+            with self.engine.begin() as conn:
+                for ddl in creates:
+                    conn.execute(ddl)
+            self.invalidate()
+
+
+def ensure_tables(engine, tables=None):
+    """Create whatever ``tables`` (default: every model table) lack on ``engine``.
+
+    A drop-in for ``Base.metadata.create_all(engine, tables=...)`` that
+    checks the cached reflection instead of querying each table.
+    """
+    return SchemaManager(engine).sync(tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the models with the target database schema.")
+    parser.add_argument('tables', nargs='*', help="model tables to compare (default: all)")
+    parser.add_argument('--url', help="target database URL or local .db file (default: the .env database)")
+    parser.add_argument('--apply', action='store_true', help="run the DDL that is needed")
+    parser.add_argument('--refresh', action='store_true', help="reflect the target again instead of using the cache")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.tables if name not in Base.metadata.tables]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+
+    # targets creates tables through this module
+    from loaders.targets import target_engine
+
+    manager = SchemaManager(target_engine(args.url))
+    manager.catalogue(refresh=args.refresh)
+    changes = manager.diff([Base.metadata.tables[name] for name in args.tables] or None)
+    dialect = manager.engine.dialect
+    for change in changes:
+        ddl = str(change.ddl.compile(dialect=dialect)).strip() if change.ddl is not None else "(not changed)"
+        print(f"{change.table} - {change.kind} {change.name}: {ddl}")
+    if not changes:
+        print("The schema matches the models.")
+    if args.apply:
+        print(f"{len(manager.apply(changes))} changes applied.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# Server-side bulk loading: set-based JSON inserts and bcp, chosen by size.
+#
+# bulk_insert still sends rows one parameter set at a time, even if pyodbc
+# packs them into one array. Two faster paths hand the server whole batches:
+#
+#   * 'json' serializes a batch to one JSON document sent as a single
+#     parameter. The server expands it set-based: OPENJSON on SQL Server,
+#     json_each on SQLite. So the same path runs, and can be checked, on a
+#     local staging file. One round-trip carries up to JSON_BATCH_ROWS rows.
+#   * 'bcp' writes the table to a UTF-8 character-format data file and runs
+#     the bcp utility, the SQL Server bulk-copy protocol. bcp commits on its
+#     own connection, so it is not part of the caller's transaction.
+#
+# The password never goes on bcp's command line, where any local user could
+# read it with ps. Without a username bcp signs in with -T (Windows or
+# Kerberos integrated security). An ``authentication=ActiveDirectory...``
+# query in the engine URL adds -G for Azure AD; the integrated, managed
+# identity and interactive kinds need no password either. Only SQL logins
+# and ActiveDirectoryPassword fall back to -U alone: bcp then prompts for the
+# password, and run_bcp writes it to bcp's stdin. bcp runs without a
+# controlling terminal and with a timeout, so a prompt it cannot answer from
+# stdin fails the load instead of hanging it.
+#
+# IDENTITY keys are kept as they are in the CSVs (-E for bcp, IDENTITY_INSERT
+# around the JSON insert), since child tables refer to them.
+#
+# 'records' is executemany with positional tuples instead of a dict per row
+# (see loaders/records.py).
+#
+# With strategy='auto' small tables keep using executemany. Larger ones use
+# JSON, and very large ones use bcp when it is installed and the target is
+# SQL Server. RecordingRunner stands in for bcp and keeps the command and
+# data file it was given, so the bcp path can be checked without a server.
+
+import os
+import shutil
+import subprocess
+import tempfile
+from decimal import Decimal
+
+import pandas
+from sqlalchemy import Date, DateTime, Integer, text
+from sqlalchemy.engine import Engine
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, bulk_insert, column_keys, identity_insert
+from loaders.queries import tables_written
+from loaders.records import RowBatch, insert_records
+
+STRATEGIES = ('auto', 'executemany', 'records', 'json', 'bcp')
+
+# Tables up to this size gain nothing from a bulk path
+EXECUTEMANY_MAX_ROWS = 10000
+# Tables from this size go through bcp when it is available
+BCP_MIN_ROWS = 1000000
+JSON_BATCH_ROWS = 50000
+# Seconds before a bcp run is given up
+BCP_TIMEOUT = 2 * 60 * 60
+
+# Unit and record separators never appear in the text columns of dbs/
+BCP_FIELD_TERMINATOR = '\x1f'
+BCP_ROW_TERMINATOR = '\x1e'
+# Azure AD sign-ins that need no password
+PASSWORDLESS_AUTHENTICATION = ('activedirectoryintegrated', 'activedirectoryinteractive',
+                               'activedirectorymsi', 'activedirectorymanagedidentity',
+                               'activedirectorydefault')
+
+
+def bcp_path():
+    """Return the path of the bcp utility, or None if it is not installed."""
+    return shutil.which('bcp')
+
+
+def choose_strategy(rows, dialect_name, bcp_available=None):
+    """Pick a load strategy for a table of ``rows`` rows."""
+    if rows <= EXECUTEMANY_MAX_ROWS or dialect_name not in ('mssql', 'sqlite'):
+        return 'executemany'
+    if bcp_available is None:
+        bcp_available = bcp_path() is not None
+    if rows >= BCP_MIN_ROWS and dialect_name == 'mssql' and bcp_available:
+        return 'bcp'
+    return 'json'
+
+
+def _portable(frame, table):
+    # JSON and bcp both want dates as ISO text, exact decimals as text and
+    # whole-number columns as integers (a float column with gaps prints 275.0)
+    frame = frame.copy()
+    for name in frame.columns:
+        column_type = table.columns[name].type
+        values = frame[name]
+        if isinstance(column_type, (Date, DateTime)) and pandas.api.types.is_datetime64_any_dtype(values):
+            fmt = '%Y-%m-%d' if not isinstance(column_type, DateTime) else '%Y-%m-%d %H:%M:%S'
+            frame[name] = values.dt.strftime(fmt)
+        elif isinstance(column_type, Integer) and pandas.api.types.is_float_dtype(values):
+            frame[name] = values.astype('Int64')
+        elif values.dtype == object and isinstance(next(iter(values.dropna()), None), Decimal):
+            frame[name] = values.map(lambda value: None if value is None else str(value))
+    return frame
+
+
+def json_insert_statement(table, keys, dialect):
+    """INSERT ... SELECT that expands a JSON array of row objects server-side."""
+    preparer = dialect.identifier_preparer
+    names = ', '.join(preparer.quote(table.c[key].name) for key in keys)
+    if dialect.name == 'mssql':
+        shape = ', '.join(f"{preparer.quote(table.c[key].name)} "
+                          f"{table.c[key].type.compile(dialect=dialect)} '$.\"{key}\"'" for key in keys)
+        source = f"SELECT {names} FROM OPENJSON(:payload) WITH ({shape})"
+    elif dialect.name == 'sqlite':
+        values = ', '.join(f"json_extract(value, '$.\"{key}\"')" for key in keys)
+        source = f"SELECT {values} FROM json_each(:payload)"
+    else:
+        raise NotImplementedError(f"JSON bulk inserts are not supported on {dialect.name}")
+    return text(f"INSERT INTO {preparer.format_table(table)} ({names}) {source}")
+
+
+def json_insert(frame, model, bind, columns=None, batch_size=JSON_BATCH_ROWS):
+    """Insert ``frame`` with one JSON parameter per ``batch_size`` rows.
+
+    ``bind`` is an Engine (committed here) or a Connection (left to the
+    caller). Returns the number of rows sent.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return json_insert(frame, model, conn, columns, batch_size)
+    mapping = column_keys(model, frame, columns)
+    frame = _portable(frame[list(mapping)].rename(columns=mapping), model.__table__)
+    statement = json_insert_statement(model.__table__, list(frame.columns), bind.dialect)
+    total = 0
+    with identity_insert(bind, model.__table__, list(frame.columns)):
+        for start in range(0, len(frame), batch_size):
+            chunk = frame.iloc[start:start + batch_size]
+            bind.execute(statement, {'payload': chunk.to_json(orient='records', force_ascii=False)})
+            total += len(chunk)
+    return total
+
+
+def write_bcp_file(frame, table, path):
+    """Write ``frame`` as a bcp character-format file in ``table``'s column order.
+
+    Columns the frame lacks are left empty, which bcp -k loads as NULL.
+    """
+    frame = _portable(frame, table)
+    empty = pandas.Series('', index=frame.index, dtype='string')
+    fields = [frame[column.key].astype('string').fillna('') if column.key in frame else empty
+              for column in table.columns]
+    lines = fields[0]
+    for field in fields[1:]:
+        lines = lines + BCP_FIELD_TERMINATOR + field
+    with open(path, 'w', encoding='utf-8', newline='') as handle:
+        handle.write(BCP_ROW_TERMINATOR.join(lines))
+        if len(lines):
+            handle.write(BCP_ROW_TERMINATOR)
+    return len(frame)
+
+
+def _authentication(url):
+    # The ODBC Authentication keyword, lower-cased, from the URL query
+    values = [str(value).lower() for key, value in url.query.items() if key.lower() == 'authentication']
+    return values[0] if values else ''
+
+
+def bcp_command(table, engine, path, batch_size=DEFAULT_BATCH_SIZE, executable='bcp'):
+    """Build the bcp arguments that load ``path`` into ``table`` on ``engine``.
+
+    The arguments never hold the password; see bcp_password.
+    """
+    url = engine.url
+    command = [
+        executable, f'{url.database}.dbo.{table.name}', 'in', path,
+        '-S', url.host if url.port is None else f'{url.host},{url.port}',
+        # -E keeps the IDENTITY values from the file instead of renumbering them
+        '-c', '-C', '65001', '-k', '-E',
+        '-t', f'0x{ord(BCP_FIELD_TERMINATOR):02x}', '-r', f'0x{ord(BCP_ROW_TERMINATOR):02x}',
+        '-b', str(batch_size), '-h', 'TABLOCK',
+    ]
+    authentication = _authentication(url)
+    if authentication.startswith('activedirectory'):
+        command += ['-G']
+    if url.username:
+        command += ['-U', url.username]
+    elif not authentication:
+        command += ['-T']
+    return command
+
+
+def bcp_password(engine):
+    """Return the password bcp will prompt for, or None if it signs in without one."""
+    url = engine.url
+    if not url.username or _authentication(url) in PASSWORDLESS_AUTHENTICATION:
+        return None
+    return url.password or ''
+
+
+def run_bcp(command, password=None, timeout=BCP_TIMEOUT):
+    """Run bcp, answering its password prompt through stdin.
+
+    bcp gets no controlling terminal (a new session), so a prompt it tries
+    to read from the terminal fails rather than waiting. That bcp reads the
+    prompt from stdin has not been checked against Microsoft's bcp; where it
+    does not, use -T or Azure AD sign-in. Raises RuntimeError if bcp runs
+    longer than ``timeout`` seconds.
+    """
+    try:
+        # Without a password stdin is empty, so an unexpected prompt gets end-of-file
+        subprocess.run(command, input='' if password is None else password + '\n',
+                       check=True, capture_output=True, text=True, timeout=timeout,
+                       start_new_session=True)
+    except subprocess.TimeoutExpired as e:
+        raise RuntimeError(f"bcp did not finish within {timeout} seconds and was stopped; "
+                           f"if it was waiting for a password, sign in with -T or Azure AD instead") from e
+
+
+class RecordingRunner:
+    """Stands in for bcp: records each command and the data file it would load."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, command, password=None):
+        path = command[3]
+        with open(path, encoding='utf-8', newline='') as handle:
+            payload = handle.read()
+        # Only whether a password was given, never the password itself
+        self.calls.append((command, payload, password is not None))
+
+
+def bcp_insert(frame, model, engine, columns=None, batch_size=DEFAULT_BATCH_SIZE, runner=run_bcp):
+    """Load ``frame`` through bcp. Returns the number of rows written."""
+    mapping = column_keys(model, frame, columns)
+    frame = frame[list(mapping)].rename(columns=mapping)
+    handle, path = tempfile.mkstemp(suffix='.bcp')
+    os.close(handle)
+    try:
+        rows = write_bcp_file(frame, model.__table__, path)
+        runner(bcp_command(model.__table__, engine, path, batch_size, bcp_path() or 'bcp'),
+               bcp_password(engine))
+    finally:
+        os.remove(path)
+        # bcp writes on its own connection, which the query caches cannot see
+        tables_written(engine, model.__table__.name)
+    return rows
+
+
+def server_bulk_insert(frame, model, bind, columns=None, batch_size=DEFAULT_BATCH_SIZE,
+                       strategy='auto', runner=run_bcp):
+    """Insert ``frame`` with the strategy that suits its size and the target.
+
+    ``strategy`` is 'auto' or one of 'executemany', 'records', 'json' and
+    'bcp'. With a Connection as ``bind``, all but 'bcp' join its transaction;
+    'bcp' always commits on its own. Returns the number of rows sent.
+    """
+    if strategy == 'auto':
+        strategy = choose_strategy(len(frame), bind.dialect.name)
+    if strategy == 'executemany':
+        return bulk_insert(frame, model, bind, columns, batch_size)
+    if strategy == 'records':
+        return insert_records(RowBatch.from_frame(frame, model, columns), model, bind, batch_size)
+    if strategy == 'json':
+        return json_insert(frame, model, bind, columns)
+    if strategy == 'bcp':
+        return bcp_insert(frame, model, bind.engine, columns, batch_size, runner)
+    raise ValueError(f"Unknown load strategy: {strategy}")
@@ -0,0 +1,71 @@
+# Chunked, streaming CSV ingestion for the datasets under dbs/.
+#
+# Instead of reading a whole file, validating it and only then uploading it,
+# each fixed-size chunk is read, cleaned, validated and inserted before the
+# next one is parsed. Only one chunk (two with ``overlap=True``) is held in
+# memory at a time, so peak memory does not grow with the file size.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.engine import Engine
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, bulk_insert
+from loaders.csv_dialect import read_dbs_csv
+from loaders.validation import validate_frame
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNK_SIZE):
+    """Yield clean DataFrames of at most ``chunksize`` rows from the CSV at ``path``."""
+    return read_dbs_csv(path, chunksize=chunksize)
+
+
+def validate_chunk(frame, model, columns=None):
+    """Check ``frame`` against ``model`` and raise ValueError on any issue."""
+    validate_frame(frame, model, columns).raise_for_issues()
+    return frame
+
+
+def _prepare(chunks, model, columns, clean, validate):
+    for chunk in chunks:
+        if clean is not None:
+            chunk = clean(chunk)
+        if validate is not None:
+            validate(chunk, model, columns)
+        yield chunk
+
+
+def stream_load(path, model, bind, columns=None, chunksize=DEFAULT_CHUNK_SIZE,
+                clean=None, validate=validate_chunk, overlap=False,
+                batch_size=DEFAULT_BATCH_SIZE):
+    """Read, clean, validate and insert the CSV at ``path`` chunk by chunk.
+
+    Chunks come from ``read_dbs_csv``, so quotes and padding are already gone.
+    ``clean`` and ``validate`` run on every chunk; pass ``None`` to skip either.
+    With ``overlap=True`` each chunk is inserted on a background thread while
+    the next one is parsed, so at most two chunks are alive at once.
+
+    ``bind`` is an Engine or Connection, as for ``bulk_insert``. The whole file
+    goes through one transaction. Returns the number of rows inserted.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return stream_load(path, model, conn, columns, chunksize, clean,
+                               validate, overlap, batch_size)
+
+    chunks = _prepare(read_chunks(path, chunksize), model, columns, clean, validate)
+    if not overlap:
+        return sum(bulk_insert(chunk, model, bind, columns, batch_size) for chunk in chunks)
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending = None
+        for chunk in chunks:
+            # chunk N+1 has been parsed; wait for chunk N before queueing it
+            if pending is not None:
+                total += pending.result()
+            pending = writer.submit(bulk_insert, chunk, model, bind, columns, batch_size)
+        if pending is not None:
+            total += pending.result()
+    return total
@@ -0,0 +1,132 @@
+# Load targets: Azure SQL from .env, or a local staging database.
+#
+# The same models and loaders run against a local SQLite file, so loads can
+# be staged and measured without a network. SQLite connections are opened in
+# WAL mode with pragmas tuned for bulk loading, and FK enforcement switched
+# on so the local file rejects what Azure SQL would. DuckDB works through
+# the optional duckdb-engine package. copy_database then pushes a staged file
+# up to the real target table by table, in foreign-key order:
+#
+#     python -m loaders.catalogue --url staging.db
+#     python -m loaders.targets staging.db            # copy into the .env database
+
+import argparse
+import os
+import sys
+
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.engine import make_url
+
+from loaders.bulk_loader import DEFAULT_BATCH_SIZE, enable_fast_executemany
+from loaders.connection import get_engine
+from loaders.models import Base
+from loaders.parallel_loader import run_in_fk_order
+from loaders.schema import ensure_tables
+
+DEFAULT_STAGING = 'staging.db'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # WAL keeps the file consistent on a crash; only the last commits can be lost
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'temp_store': 'MEMORY',
+    'cache_size': -64000,  # KiB
+    'mmap_size': 268435456,
+    'busy_timeout': 30000,  # ms; parallel table loads queue for the single writer
+}
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return on_connect
+
+
+def sqlite_engine(path=DEFAULT_STAGING, pragmas=None):
+    """Return the shared engine for a local SQLite file with load pragmas set."""
+    engine = get_engine(f'sqlite:///{path}')
+    if not getattr(engine, 'sqlite_pragmas', None):
+        engine.sqlite_pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+        event.listen(engine, 'connect', _set_pragmas(engine.sqlite_pragmas))
+        # Connections opened before the listener existed lack the pragmas
+        engine.dispose()
+    return engine
+
+
+def target_engine(target=None):
+    """Return the engine for ``target``.
+
+    ``None`` is the Azure SQL database from .env, a path ending in .db or
+    .sqlite (or a sqlite:/// URL) is a local staging file, and any other
+    URL is passed to ``get_engine``.
+    """
+    if target is None:
+        return get_engine()
+    if target.endswith(('.db', '.sqlite')) and '://' not in target:
+        return sqlite_engine(target)
+    url = make_url(target)
+    if url.get_backend_name() == 'sqlite' and url.database:
+        return sqlite_engine(url.database)
+    if url.get_backend_name() == 'duckdb':
+        try:
+            import duckdb_engine  # noqa: F401
+        except ImportError:
+            raise ImportError("DuckDB targets need the duckdb-engine package") from None
+    return get_engine(url)
+
+
+def copy_table(table, source, target, batch_size=DEFAULT_BATCH_SIZE):
+    """Copy every row of ``table`` from ``source`` to ``target`` in batches."""
+    enable_fast_executemany(target)
+    statement = insert(table)
+    total = 0
+    with source.connect() as reader, target.begin() as writer:
+        result = reader.execution_options(yield_per=batch_size).execute(select(table))
+        for rows in result.mappings().partitions():
+            writer.execute(statement, [dict(row) for row in rows])
+            total += len(rows)
+    return total
+
+
+def copy_database(source, target, tables=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=4):
+    """Copy staged tables from ``source`` to ``target`` in foreign-key order.
+
+    ``tables`` defaults to every model table that exists in ``source``.
+    Missing tables are created on ``target`` first. Returns a dict of table
+    name -> rows copied.
+    """
+    if tables is None:
+        existing = set(inspect(source).get_table_names())
+        tables = [table for table in Base.metadata.sorted_tables if table.name in existing]
+    ensure_tables(target, tables)
+
+    def task(table):
+        return lambda: copy_table(table, source, target, batch_size)
+
+    return run_in_fk_order({table: task(table) for table in tables}, max_workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy a staged SQLite file into a target database.")
+    parser.add_argument('source', help="staged SQLite file")
+    parser.add_argument('tables', nargs='*', help="tables to copy (default: every staged model table)")
+    parser.add_argument('--url', help="target database (default: the .env database)")
+    parser.add_argument('--workers', type=int, default=4, help="tables copied at the same time")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        parser.error(f"no such file: {args.source}")
+
+    tables = [Base.metadata.tables[name] for name in args.tables] or None
+    results = copy_database(sqlite_engine(args.source), target_engine(args.url), tables,
+                            max_workers=args.workers)
+    for table, rows in results.items():
+        print(f"{table} - {rows} rows copied.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
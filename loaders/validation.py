@@ -0,0 +1,167 @@
+# Schema validation of DataFrames against the declarative models.
+#
+# Step 7 of the setup scripts used to repeat hand-written expected dtype
+# dicts, required column lists and separate null-count passes for every
+# DataFrame. Here the expectations come straight from the model's Column
+# definitions (type, primary key, nullability, String length, Numeric
+# precision and scale), and each column is checked once with vectorized
+# masks. The report lists every failed check with the offending row labels.
+
+from collections import namedtuple
+
+import numpy
+import pandas
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, String
+
+from loaders.bulk_loader import column_keys
+
+Expectation = namedtuple('Expectation', 'name key kind nullable length precision scale')
+Issue = namedtuple('Issue', 'column check message rows')
+
+
+def _kind(column_type):
+    # Order matters: Float is a Numeric and DateTime is not a Date
+    if isinstance(column_type, Boolean):
+        return 'boolean'
+    if isinstance(column_type, Integer):
+        return 'integer'
+    if isinstance(column_type, Numeric):
+        return 'numeric'
+    if isinstance(column_type, (Date, DateTime)):
+        return 'date'
+    if isinstance(column_type, String):
+        return 'string'
+    return 'other'
+
+
+def expectations(model, frame, columns=None):
+    """Describe what each of ``model``'s columns requires of ``frame``.
+
+    Returns a list of Expectation, one per table column. ``name`` is the
+    DataFrame column mapped to it (via ``columns``), or None if absent.
+    """
+    names = {key: name for name, key in column_keys(model, frame, columns).items()}
+    result = []
+    for column in model.__table__.columns:
+        column_type = column.type
+        result.append(Expectation(
+            name=names.get(column.key),
+            key=column.key,
+            kind=_kind(column_type),
+            nullable=column.nullable and not column.primary_key,
+            length=getattr(column_type, 'length', None),
+            precision=getattr(column_type, 'precision', None),
+            scale=getattr(column_type, 'scale', None),
+        ))
+    return result
+
+
+class ValidationReport:
+    """Every failed check for one DataFrame, with the offending row labels."""
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+        self.issues = []
+
+    def add(self, column, check, message, rows=None):
+        rows = pandas.Index([]) if rows is None else rows
+        self.issues.append(Issue(column, check, message, rows))
+
+    @property
+    def ok(self):
+        return not self.issues
+
+    def bad_rows(self):
+        """Return the labels of every row that failed at least one check."""
+        labels = pandas.Index([])
+        for issue in self.issues:
+            labels = labels.union(issue.rows)
+        return labels
+
+    def messages(self):
+        return [f"{self.table} - {issue.message}" for issue in self.issues]
+
+    def raise_for_issues(self):
+        if self.issues:
+            raise ValueError('; '.join(self.messages()))
+
+
+# Each check helper returns a list of (check, mask, phrase) tuples and skips
+# checks that the column's dtype already guarantees.
+
+def _string_checks(series, expectation):
+    if not expectation.length:
+        return []
+    length = series.astype('string').str.len()
+    return [('length', length > expectation.length, f"longer than {expectation.length} characters")]
+
+
+def _integer_checks(series):
+    if pandas.api.types.is_integer_dtype(series) or pandas.api.types.is_bool_dtype(series):
+        return []
+    values = pandas.to_numeric(series, errors='coerce')
+    return [('type', series.notna() & (values.isna() | (values % 1 != 0)), "that are not integers")]
+
+
+def _numeric_checks(series, expectation):
+    checks = []
+    if pandas.api.types.is_numeric_dtype(series):
+        values = series.astype('float64')
+    else:
+        values = pandas.to_numeric(series.astype(object), errors='coerce')
+        checks.append(('type', series.notna() & values.isna(), "that are not numeric"))
+    if expectation.precision is not None:
+        scale = expectation.scale or 0
+        limit = 10.0 ** (expectation.precision - scale)
+        checks.append(('precision', values.abs() >= limit,
+                       f"that exceed Numeric({expectation.precision}, {scale})"))
+        rounded = values.round(scale)
+        checks.append(('scale', values.notna() & ~numpy.isclose(values, rounded),
+                       f"with more than {scale} decimal places"))
+    return checks
+
+
+def _date_checks(series):
+    if pandas.api.types.is_datetime64_any_dtype(series):
+        return []
+    values = pandas.to_datetime(series, errors='coerce')
+    return [('type', series.notna() & values.isna(), "that are not dates")]
+
+
+def validate_frame(frame, model, columns=None):
+    """Check ``frame`` against every constraint ``model`` declares.
+
+    ``columns`` renames DataFrame columns to model attributes, as for
+    ``bulk_insert``. Returns a ValidationReport.
+    """
+    report = ValidationReport(model.__tablename__, len(frame))
+    for expectation in expectations(model, frame, columns):
+        name = expectation.name
+        if name is None:
+            report.add(expectation.key, 'missing', f"Missing required column {expectation.key}")
+            continue
+        series = frame[name]
+        null = series.isna()
+
+        if not expectation.nullable and null.any():
+            report.add(name, 'null', f"Column {name} contains {int(null.sum())} null values",
+                       frame.index[null.to_numpy()])
+
+        if expectation.kind == 'integer':
+            checks = _integer_checks(series)
+        elif expectation.kind == 'numeric':
+            checks = _numeric_checks(series, expectation)
+        elif expectation.kind == 'date':
+            checks = _date_checks(series)
+        elif expectation.kind == 'string':
+            checks = _string_checks(series, expectation)
+        else:
+            checks = []
+
+        for check, mask, phrase in checks:
+            mask = mask.fillna(False).to_numpy(dtype=bool)
+            if mask.any():
+                report.add(name, check, f"Column {name} has {int(mask.sum())} values {phrase}",
+                           frame.index[mask])
+    return report
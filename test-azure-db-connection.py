@@ -1,20 +1,10 @@
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from loaders.connection import get_engine
+from loaders.schema import SchemaManager
 
-load_dotenv()
+# Get the shared, pooled engine built from the DB_* variables in .env
+engine = get_engine()
 
-# Define server and database information
-server_name = os.getenv('SERVER_NAME', 'default_server')
-database = os.getenv('DATABASE_NAME', 'default_database')
-username = os.getenv('DB_USERNAME', 'default_username')
-password = os.getenv('DB_PASSWORD', 'default_password')
-driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
-
-# Create the database engine
-engine = create_engine(f'mssql+pyodbc://{username}:{password}@{server_name}/{database}?driver={driver}')
-
-# Create inspector and get table information
-inspector = inspect(engine)
-print(inspector.get_table_names())
\ No newline at end of file
+# Reflect the whole catalogue in one batched pass and list the tables
+# refresh=True always asks the server, which is the point of a connection test
+schema = SchemaManager(engine)
+print(schema.table_names(refresh=True))
\ No newline at end of file
@@ -1,35 +1,16 @@
 # database_setup.py
 
-from sqlalchemy import create_engine, Column, Integer, String, inspect
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from loaders.connection import get_engine
+from loaders.models import User
+from loaders.schema import ensure_tables
 
-load_dotenv()
-
-# Define server and database information
-server_name = os.getenv('SERVER_NAME', 'default_server')
-database = os.getenv('DATABASE_NAME', 'default_database')
-username = os.getenv('DB_USERNAME', 'default_username')
-password = os.getenv('DB_PASSWORD', 'default_password')
-driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
-
-# Create the database engine
-engine = create_engine(f'mssql+pyodbc://{username}:{password}@{server_name}/{database}?driver={driver}')
+# Get the shared, pooled engine built from the DB_* variables in .env
+engine = get_engine()
 Session = sessionmaker(bind=engine)
-Base = declarative_base()
-
-
-
-
 
-class User(Base):
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True)
-    name = Column(String)
-    email = Column(String)
+# The User model lives in loaders/models.py with the other declarative models
 
 # Create tables
 def create_tables():
-    Base.metadata.create_all(engine)
+    ensure_tables(engine, tables=[User.__table__])
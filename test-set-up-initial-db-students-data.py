@@ -7,13 +7,17 @@
 ## Step 2: Import Necessary Libraries
 ### - Import `pandas` for data manipulation, `SQLAlchemy` for ORM functionality, and other required libraries.
 
+import sys
+
 import pandas
 # Import the necessary libraries
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.ext.declarative import declarative_base
-import os
-from dotenv import load_dotenv
+from loaders.connection import get_engine
+from loaders.csv_dialect import read_dbs_csv
+from loaders.models import Student, Teacher, STUDENT_COLUMNS, TEACHER_COLUMNS
+from loaders.schema import ensure_tables
+from loaders.incremental import incremental_load
+from loaders.validation import validate_frame
+from loaders.integrity import IntegrityChecker
 
 ## ------------------------ DONE ------------------------ 
 
@@ -24,10 +28,11 @@ from dotenv import load_dotenv
 
 ## Step 3: Load CSV Files
 ### - Use pandas to read CSV files from the specified directory. Ensure you handle any potential encoding issues or missing data during this step.
+### - read_dbs_csv understands the single-quoted, space-padded dialect of the dbs/ files, so the values arrive without quotes or padding.
 
 
-students_df = pandas.read_csv('dbs/students/students.csv')
-teachers_df = pandas.read_csv('dbs/students/teachers.csv')
+students_df = read_dbs_csv('dbs/students/students.csv')
+teachers_df = read_dbs_csv('dbs/students/teachers.csv')
 
 ## ------------------------ DONE ------------------------ 
 
@@ -38,18 +43,18 @@ teachers_df = pandas.read_csv('dbs/students/teachers.csv')
 ### - Inspect the dataframes for any inconsistencies, missing values, or data type discrepancies. Perform necessary data cleaning and transformation to match the target database schema.
 
 
-#### Step 4a. Confirm that the Classroom variable is the same in both dataframes using code like the following:
-
-##### i. Convert the unique values in 'Classroom_ID' columns from both dataframes to sets
-students_df_classrooms = set(students_df['Classroom_ID'].unique())
-teachers_df_classrooms = set(teachers_df['Classroom_ID'].unique())
-
- 
-##### ii. Check if the sets are equal
-if students_df_classrooms == teachers_df_classrooms:
-    print("The Classroom variable numbers are the same in both dataframes.")
-else:
-    print("The Classroom variable numbers are not the same in both dataframes.")
+#### Step 4a. Confirm that every student's Classroom_ID belongs to a teacher and that the keys are unique
+##### Teachers are checked first so that students can be checked against their classroom ids
+checker = IntegrityChecker()
+for label, df, model, columns in [
+    ('Teachers', teachers_df, Teacher, TEACHER_COLUMNS),
+    ('Students', students_df, Student, STUDENT_COLUMNS),
+]:
+    report = checker.check(df, model, columns)
+    if report.ok:
+        print(f"{label} - Keys are unique and every foreign key has a parent row.")
+    for message in report.messages():
+        print(message)
 
 
 ## ------------------------ DONE ------------------------ 
@@ -59,17 +64,8 @@ else:
 ### - Set up environment variables for sensitive information like database credentials (username, password, server address).
 ### - Create a connection to the Azure database using SQLAlchemy. This step should include configuring the connection string and establishing the connection using an engine and session object.
 
-load_dotenv()
-
-# Define server and database information
-server_name = os.getenv('SERVER_NAME', 'default_server')
-database = os.getenv('DATABASE_NAME', 'default_database')
-username = os.getenv('DB_USERNAME', 'default_username')
-password = os.getenv('DB_PASSWORD', 'default_password')
-driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
-
-# Create the database engine for SQL Server
-engine = create_engine(f'mssql+pyodbc://{username}:{password}@{server_name}/{database}?driver={driver}')
+# Get the shared, pooled engine built from the DB_* variables in .env
+engine = get_engine()
 
 
 ## ------------------------ DONE ------------------------ 
@@ -80,23 +76,8 @@ engine = create_engine(f'mssql+pyodbc://{username}:{password}@{server_name}/{dat
 ## Step 6: Define Database Schema
 ### - Define or confirm the schema of the target database tables if not already existing. This involves setting up classes in SQLAlchemy to mirror the tables you intend to upload the data to, which could also include defining relationships between tables if necessary.
 
-Base = declarative_base()
-
-class Student(Base):
-    __tablename__ = 'students'
-    id = Column(Integer, primary_key=True)
-    last_name = Column(String)
-    first_name = Column(String)
-    grade = Column(Integer)
-    classroom_id = Column(Integer, ForeignKey('teachers.classroom_id'))
-
-class Teacher(Base):
-    __tablename__ = 'teachers'
-    classroom_id = Column(Integer, primary_key=True)
-    last_name = Column(String)
-    first_name = Column(String)
-    # The backref 'teacher' creates a virtual column in the Student model, linking each student to their teacher
-    students = relationship("Student", backref="teacher")
+# The Student and Teacher models live in loaders/models.py so the bulk loader
+# and the benchmarks can share them with this script.
 
 
 ## ------------------------ DONE ------------------------ 
@@ -107,97 +88,17 @@ class Teacher(Base):
 ## Step 7: Validate Data against Schema
 ### - Ensure that the dataframe conforms to the database schema constraints such as data types, required fields, and unique constraints to avoid runtime errors during the upload process.
 
-#### Step 7a. Students DataFrame Validation
-##### Step 7a i. Data Types Validation
-expected_dtypes = {
-    'ID': 'int64',  
-    'LastName': 'object',
-    'FirstName': 'object',
-    'Grade': 'int64',
-    'Classroom_ID': 'int64'
-}
-
-issues_found = False
-for column, expected_dtype in expected_dtypes.items():
-    if students_df[column].dtype != expected_dtype:
-        print(f"Students - Column {column} has incorrect type {students_df[column].dtype}, expected {expected_dtype}")
-        issues_found = True
-
-if not issues_found:
-    print("Students - All columns have the correct data type.")
-
-
-##### Step 7a ii. Check for missing columns
-
-required_columns = ['ID', 'LastName', 'FirstName', 'Grade', 'Classroom_ID']
-missing_columns = [col for col in required_columns if col not in students_df.columns]
-if missing_columns:
-    print(f"Students - Missing required columns: {missing_columns}")
-else:
-    print("Students - All required columns are present.")
-
-
-
-
-
-##### Step 7a ii. Check for null values in required columns
-issues_found = False
-null_checks = students_df[required_columns].isnull().sum()
-for column, null_count in null_checks.items():
-    if null_count > 0:
-        print(f"Students - Column {column} contains {null_count} null values")
-        issues_found = True
-
-if not issues_found:
-    print("Students - No null values found in required columns.")
-
-
-
-
-
-
-
-#### Step 7b. Teachers DataFrame Validation
-##### Step 7b i. Data Types Validation
-expected_dtypes = {
-    'Classroom_ID': 'int64',
-    'LastName': 'object',
-    'FirstName': 'object'
-}
-
-issues_found = False
-for column, expected_dtype in expected_dtypes.items():
-    if teachers_df[column].dtype != expected_dtype:
-        print(f"Teachers - Column {column} has incorrect type {teachers_df[column].dtype}, expected {expected_dtype}")
-        issues_found = True
-
-if not issues_found:
-    print("Teachers - All columns have the correct data type.")
-
-
-##### Step 7b ii. Check for missing columns
-
-required_columns = ['Classroom_ID', 'LastName', 'FirstName']
-missing_columns = [col for col in required_columns if col not in teachers_df.columns]
-if missing_columns:
-    print(f"Teachers - Missing required columns: {missing_columns}")
-else:
-    print("Teachers - All required columns are present.")
-
-
-
-
-
-##### Step 7b iii. Check for null values in required columns
-issues_found = False
-null_checks = teachers_df[required_columns].isnull().sum()
-for column, null_count in null_checks.items():
-    if null_count > 0:
-        print(f"Teachers - Column {column} contains {null_count} null values")
-        issues_found = True
-
-if not issues_found:
-    print("Teachers - No null values found in required columns.")
+#### Step 7a. Students and Teachers DataFrame Validation
+##### The expected types, required columns and nullability all come from the models in loaders/models.py
+for label, df, model, columns in [
+    ('Students', students_df, Student, STUDENT_COLUMNS),
+    ('Teachers', teachers_df, Teacher, TEACHER_COLUMNS),
+]:
+    report = validate_frame(df, model, columns)
+    if report.ok:
+        print(f"{label} - All columns match the schema.")
+    for message in report.messages():
+        print(message)
 
 
 ## ------------------------ DONE ------------------------ 
@@ -216,46 +117,30 @@ if not issues_found:
 
 
 ## Step 8: Upload Data to Database
-### - Use the SQLAlchemy session to add data from the dataframe to the database. This could involve converting the dataframe into the defined SQLAlchemy ORM classes before adding and committing them to the database.
-
-# Create all tables in the engine
-Base.metadata.create_all(engine)
-
-# Create a configured "Session" class
-Session = sessionmaker(bind=engine)
-
-# Create a session
-session = Session()
-# Step 1: Convert DataFrame Rows to ORM Objects and Add to Session
-# Adding students
-for index, row in students_df.iterrows():
-    student = Student(
-        id=row['ID'],  # Assuming 'ID' is the column name in your DataFrame
-        last_name=row['LastName'],
-        first_name=row['FirstName'],
-        grade=row['Grade'],
-        classroom_id=row['Classroom_ID']
-    )
-    session.add(student)  # Step 2: Add ORM Object to Session
-
-# Adding teachers
-for index, row in teachers_df.iterrows():
-    teacher = Teacher(
-        classroom_id=row['Classroom_ID'],
-        last_name=row['LastName'],
-        first_name=row['FirstName']
-    )
-    session.add(teacher)
-
-# Step 3: Commit the Session
+### - Use the bulk loader to insert the dataframe rows into the tables behind the SQLAlchemy models, one executemany batch at a time.
+### - Rows that were uploaded by an earlier run are skipped, and changed rows are updated in place (MERGE).
+### - Run the script with --full to upload every row again, whatever the manifest remembers.
+
+# Create the students and teachers tables in the engine if they are missing
+# The schema is reflected once and cached in .schema_cache.json, so re-runs make no existence checks
+ensure_tables(engine, tables=[Teacher.__table__, Student.__table__])
+
+# Step 1: Upload only the rows that are new or changed since the last run
+# The manifest in .load_manifest.db remembers what was sent to this database, so re-running the script skips unchanged files
+# If a table holds fewer rows than the manifest sent (it was dropped or emptied), every row is sent again
+# The dataframes validated above are uploaded as they are instead of reading the CSVs again
+# Teachers go first because students reference them through classroom_id
+full_reload = '--full' in sys.argv[1:]
 try:
-    session.commit()
+    for path, df, model, columns in [
+        ('dbs/students/teachers.csv', teachers_df, Teacher, TEACHER_COLUMNS),
+        ('dbs/students/students.csv', students_df, Student, STUDENT_COLUMNS),
+    ]:
+        sent = incremental_load(path, model, engine, columns=columns, frame=df, full=full_reload)
+        print(f"{model.__tablename__} - {sent} new or changed rows uploaded.")
     print("Data successfully added to the database.")
 except Exception as e:
-    session.rollback()  # Rollback the changes on error
+    # The failed table's transaction is rolled back automatically
     print(f"An error occurred: {e}")
 
-# Step 4: Close the Session
-session.close()
-
 ## ------------------------ DONE ------------------------
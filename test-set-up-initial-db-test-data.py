@@ -1,37 +1,19 @@
-import os
-from dotenv import load_dotenv
-
 # Import the necessary libraries
-from sqlalchemy import Column, Integer, String, create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-
-
-
-
-load_dotenv()
+from loaders.connection import get_engine
+from loaders.models import User
+from loaders.schema import ensure_tables
 
-# Define server and database information
-server_name = os.getenv('SERVER_NAME', 'default_server')
-database = os.getenv('DATABASE_NAME', 'default_database')
-username = os.getenv('DB_USERNAME', 'default_username')
-password = os.getenv('DB_PASSWORD', 'default_password')
-driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
 
 
-# Create the database engine for SQL Server
-engine = create_engine(f'mssql+pyodbc://{username}:{password}@{server_name}/{database}?driver={driver}')
 
-Base = declarative_base()
+# Get the shared, pooled engine built from the DB_* variables in .env
+engine = get_engine()
 
-class User(Base):
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True)
-    name = Column(String)
-    email = Column(String)
+# The User model lives in loaders/models.py with the other declarative models
 
-# Create all tables in the engine
-Base.metadata.create_all(engine)
+# Create the users table in the engine if it is missing
+ensure_tables(engine, tables=[User.__table__])
 
 # Create a configured "Session" class
 Session = sessionmaker(bind=engine)
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy.dialects import mssql
+
+from loaders import bulk_loader
+
+
+class RecordingConnection:
+    """Stands in for a SQL Server connection, keeping the SQL it is sent."""
+
+    dialect = mssql.dialect()
+
+    def __init__(self):
+        self.engine = self
+        self.sent = []
+
+    def execute(self, statement, parameters=None):
+        self.sent.append(str(statement.compile(dialect=self.dialect)))
+
+    def exec_driver_sql(self, statement, parameters=None):
+        self.sent.append(statement)
+
+
+@pytest.fixture
+def mssql_connection(monkeypatch):
+    # There is no pyodbc cursor to switch fast_executemany on
+    monkeypatch.setattr(bulk_loader, 'is_mssql_pyodbc', lambda engine: False)
+    return RecordingConnection()
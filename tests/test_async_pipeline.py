@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from loaders.async_pipeline import _Pipeline, pipeline_load_async
+from loaders.catalogue import DATASETS
+from loaders.models import Teacher
+from loaders.schema import ensure_tables
+from loaders.targets import sqlite_engine
+
+
+def test_failed_table_leaves_no_stage_running(tmp_path, monkeypatch):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    specs = DATASETS['students']
+    ensure_tables(engine, [spec.model.__table__ for spec in specs])
+
+    def reject(self, chunk, spec):
+        raise ValueError("bad chunk")
+
+    monkeypatch.setattr(_Pipeline, '_clean', reject)
+
+    async def load():
+        # One-row chunks and one-chunk queues keep the reader blocked on a full queue
+        pipeline = _Pipeline(specs, engine, workers=2, chunksize=1, queue_size=1, batch_size=100)
+        with pytest.raises(ValueError):
+            await pipeline.load_table(Teacher.__table__)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(load()) == []
+    engine.dispose()
+
+
+def test_pipeline_leaves_the_callers_default_executor_alone(tmp_path):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    specs = DATASETS['students']
+    ensure_tables(engine, [spec.model.__table__ for spec in specs])
+
+    async def load():
+        loop = asyncio.get_running_loop()
+        before = loop._default_executor
+        rows = await pipeline_load_async(specs, engine, workers=2)
+        return rows, loop._default_executor is before
+
+    rows, unchanged = asyncio.run(load())
+    assert rows == {'teachers': 12, 'students': 60}
+    assert unchanged
+    engine.dispose()
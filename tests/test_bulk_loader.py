@@ -0,0 +1,20 @@
+import pandas
+
+from loaders.bulk_loader import bulk_upsert
+from loaders.models import Item, Teacher, TEACHER_COLUMNS
+
+
+def test_merge_into_identity_table_sets_identity_insert_around_it(mssql_connection):
+    frame = pandas.DataFrame({'Classroom_ID': [101], 'LastName': ['COOVER'], 'FirstName': ['GENE']})
+    assert bulk_upsert(frame, Teacher, mssql_connection, TEACHER_COLUMNS) == 1
+    first, merge, last = mssql_connection.sent
+    assert first == 'SET IDENTITY_INSERT teachers ON'
+    assert merge.startswith('MERGE INTO teachers')
+    assert last == 'SET IDENTITY_INSERT teachers OFF'
+
+
+def test_merge_without_identity_column_sends_only_the_merge(mssql_connection):
+    frame = pandas.DataFrame({'Receipt': [1], 'Ordinal': [1], 'Item': ['70-R']})
+    assert bulk_upsert(frame, Item, mssql_connection) == 1
+    assert len(mssql_connection.sent) == 1
+    assert mssql_connection.sent[0].startswith('MERGE INTO items')
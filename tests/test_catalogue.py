@@ -0,0 +1,10 @@
+import pytest
+
+from loaders.catalogue import main
+
+
+@pytest.mark.parametrize('mode', ['--incremental', '--checkpoint', '--resume'])
+def test_strategy_is_rejected_where_it_would_be_ignored(mode, capsys):
+    with pytest.raises(SystemExit):
+        main(['students', '--url', 'unused.db', mode, '--strategy', 'json'])
+    assert '--strategy cannot be combined' in capsys.readouterr().err
@@ -0,0 +1,89 @@
+import pandas
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+from loaders import checkpoint
+from loaders.checkpoint import Checkpoints, Quarantine, checkpointed_load
+from loaders.models import Base, Teacher
+from loaders.targets import sqlite_engine
+
+
+def teachers(*rows):
+    return pandas.DataFrame(rows, columns=['classroom_id', 'last_name', 'first_name'])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    Base.metadata.create_all(engine, tables=[Teacher.__table__])
+    yield engine
+    engine.dispose()
+
+
+def stored(engine):
+    with engine.connect() as conn:
+        return {row.classroom_id: (row.last_name, row.first_name)
+                for row in conn.execute(select(Teacher.__table__))}
+
+
+def quarantined(tmp_path):
+    return pandas.read_csv(tmp_path / 'quarantine' / 'teachers.csv')
+
+
+class CrashingCheckpoints(Checkpoints):
+    """Dies after committing batch ``crash_after`` but before recording it."""
+
+    crash_after = None
+
+    def save(self, target, table, fingerprint, batch_size, batches, rows, quarantined):
+        if batches == self.crash_after:
+            raise KeyboardInterrupt
+        super().save(target, table, fingerprint, batch_size, batches, rows, quarantined)
+
+
+def test_resume_after_crash_skips_committed_rows_and_quarantines_conflicts(engine, tmp_path):
+    # Classroom 1 appears twice, so the second batch bisects before committing 5 and 6
+    frame = teachers((1, 'COOVER', 'GENE'), (2, 'KRISTENSEN', 'STORMY'), (3, 'NIBLER', 'JERLENE'),
+                     (1, 'SLINGLAND', 'JOSETTE'), (5, 'MARROTTE', 'KIRK'), (6, 'SUMPTION', 'GEORGETTA'))
+    checkpoints = CrashingCheckpoints(str(tmp_path / 'checkpoints.db'))
+    checkpoints.crash_after = 2
+    options = dict(batch_size=3, checkpoints=checkpoints, quarantine=Quarantine(str(tmp_path / 'quarantine')))
+    with pytest.raises(KeyboardInterrupt):
+        checkpointed_load(frame, Teacher, engine, **options)
+
+    checkpoints.crash_after = None
+    result = checkpointed_load(frame, Teacher, engine, resume=True, **options)
+
+    assert result == (5, 1, 0, 3)
+    assert len(stored(engine)) == result.rows
+    assert stored(engine)[1] == ('COOVER', 'GENE')
+    # Quarantined by the interrupted run, and only recorded once
+    assert quarantined(tmp_path)['last_name'].tolist() == ['SLINGLAND']
+
+
+def test_transient_retry_does_not_resend_or_overwrite(engine, tmp_path, monkeypatch):
+    with engine.begin() as conn:
+        conn.execute(Teacher.__table__.insert(), [{'classroom_id': 9, 'last_name': 'HAMER', 'first_name': 'GAVIN'}])
+    frame = teachers((1, 'COOVER', 'GENE'), (2, 'KRISTENSEN', 'STORMY'), (3, 'NIBLER', 'JERLENE'),
+                     (4, 'MACROSTIE', 'MIN'), (9, 'FAFARD', 'ROCIO'))
+    send, attempts = checkpoint._send, []
+
+    def flaky_send(engine, table, rows):
+        # The first batch commits before the connection drops; the second never reaches the server
+        attempts.append(rows)
+        if len(attempts) == 1:
+            send(engine, table, rows)
+        if len(attempts) in (1, 2):
+            raise DBAPIError('INSERT', None, Exception('connection reset'), connection_invalidated=True)
+        send(engine, table, rows)
+
+    monkeypatch.setattr(checkpoint, '_send', flaky_send)
+    result = checkpointed_load(frame, Teacher, engine, batch_size=3, backoff=0,
+                               checkpoints=Checkpoints(str(tmp_path / 'checkpoints.db')),
+                               quarantine=Quarantine(str(tmp_path / 'quarantine')))
+
+    assert result == (4, 1, 2, 0)
+    assert len(stored(engine)) == 5
+    assert stored(engine)[9] == ('HAMER', 'GAVIN')
+    assert quarantined(tmp_path)['last_name'].tolist() == ['FAFARD']
@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from loaders.connection import warm_up
+from loaders.targets import sqlite_engine
+
+
+def test_warm_up_raises_instead_of_hanging_when_a_connection_fails(tmp_path, monkeypatch):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    connect, calls = engine.connect, []
+    lock = threading.Lock()
+
+    def flaky_connect():
+        with lock:
+            calls.append(None)
+            failing = len(calls) == 2
+        if failing:
+            raise OperationalError('SELECT 1', None, Exception('login failed'))
+        return connect()
+
+    monkeypatch.setattr(engine, 'connect', flaky_connect)
+    outcome = []
+
+    def run():
+        try:
+            warm_up(engine, 3)
+        except Exception as e:
+            outcome.append(e)
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+    assert isinstance(outcome[0], OperationalError)
+    engine.dispose()
@@ -0,0 +1,42 @@
+import pytest
+
+from loaders.csv_dialect import read_dbs_csv
+from loaders.incremental import Manifest, incremental_load, target_rows
+from loaders.models import Base, Teacher, TEACHER_COLUMNS
+from loaders.targets import sqlite_engine
+
+TEACHERS = 'dbs/students/teachers.csv'
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    Base.metadata.create_all(engine, tables=[Teacher.__table__])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    yield manifest
+    manifest.close()
+
+
+def test_recreated_target_is_loaded_again(engine, manifest):
+    rows = incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest)
+    assert rows == target_rows(engine, Teacher) > 0
+    assert incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest) == 0
+
+    Base.metadata.drop_all(engine, tables=[Teacher.__table__])
+    Base.metadata.create_all(engine, tables=[Teacher.__table__])
+    assert incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest) == rows
+    assert target_rows(engine, Teacher) == rows
+
+
+def test_full_reload_sends_every_row_of_the_given_frame(engine, manifest):
+    frame = read_dbs_csv(TEACHERS)
+    assert incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest, frame=frame) == len(frame)
+    assert incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest, frame=frame) == 0
+    assert incremental_load(TEACHERS, Teacher, engine, TEACHER_COLUMNS, manifest, frame=frame,
+                            full=True) == len(frame)
@@ -0,0 +1,51 @@
+import datetime
+
+from sqlalchemy import event
+
+from loaders import queries
+from loaders.models import Airline, Airport, Base, Customer, Flight, Receipt
+from loaders.queries import QueryLayer
+from loaders.targets import sqlite_engine
+
+
+def test_lookups_are_chunked_under_the_parameter_limit(tmp_path, monkeypatch):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    Base.metadata.create_all(engine, tables=[Customer.__table__, Receipt.__table__])
+    with engine.begin() as conn:
+        conn.execute(Customer.__table__.insert(), [{'Id': number, 'LastName': 'LOGAN'} for number in range(1, 6)])
+        conn.execute(Receipt.__table__.insert(), [
+            {'ReceiptNumber': number, 'Date': datetime.date(2007, 10, number), 'CustomerId': number}
+            for number in range(1, 6)])
+    monkeypatch.setattr(queries, 'LOOKUP_CHUNK', 2)
+    parameters = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            parameters.append(len(params))
+
+    found = QueryLayer(engine, cache=None).receipts_by_customer(1, 2, 3, 4, 5, 6)
+    assert {key: [receipt.ReceiptNumber for receipt in value] for key, value in found.items()} == \
+        {1: [1], 2: [2], 3: [3], 4: [4], 5: [5], 6: []}
+    assert parameters == [2, 2, 2]
+    engine.dispose()
+
+
+def test_flight_pairs_found_by_another_chunk_are_not_repeated(tmp_path, monkeypatch):
+    engine = sqlite_engine(str(tmp_path / 'target.db'))
+    Base.metadata.create_all(engine, tables=[Airline.__table__, Airport.__table__, Flight.__table__])
+    with engine.begin() as conn:
+        conn.execute(Airline.__table__.insert(), [{'Id': 1, 'Airline': 'United'}])
+        conn.execute(Airport.__table__.insert(), [{'AirportCode': code} for code in ('AAA', 'BBB', 'CCC')])
+        conn.execute(Flight.__table__.insert(), [
+            {'Airline': 1, 'FlightNo': 1, 'SourceAirport': 'AAA', 'DestAirport': 'BBB'},
+            {'Airline': 1, 'FlightNo': 2, 'SourceAirport': 'AAA', 'DestAirport': 'CCC'},
+            {'Airline': 1, 'FlightNo': 3, 'SourceAirport': 'CCC', 'DestAirport': 'BBB'}])
+    # Two pairs per query: the first one's codes also match the second one's pairs
+    monkeypatch.setattr(queries, 'LOOKUP_CHUNK', 4)
+
+    found = QueryLayer(engine, cache=None).flights_between(
+        ('AAA', 'BBB'), ('CCC', 'CCC'), ('AAA', 'CCC'), ('CCC', 'BBB'))
+    assert {pair: [flight.FlightNo for flight in flights] for pair, flights in found.items()} == \
+        {('AAA', 'BBB'): [1], ('CCC', 'CCC'): [], ('AAA', 'CCC'): [2], ('CCC', 'BBB'): [3]}
+    engine.dispose()
@@ -0,0 +1,15 @@
+import pandas
+
+from loaders.models import Teacher, TEACHER_COLUMNS
+from loaders.records import RowBatch, insert_records
+
+
+def test_insert_records_into_identity_table_sets_identity_insert_around_it(mssql_connection):
+    frame = pandas.DataFrame({'Classroom_ID': [101, 102], 'LastName': ['COOVER', 'NIBLER'],
+                              'FirstName': ['GENE', 'JERLENE']})
+    rows = RowBatch.from_frame(frame, Teacher, TEACHER_COLUMNS)
+    assert insert_records(rows, Teacher, mssql_connection) == 2
+    first, statement, last = mssql_connection.sent
+    assert first == 'SET IDENTITY_INSERT teachers ON'
+    assert statement.startswith('INSERT INTO teachers')
+    assert last == 'SET IDENTITY_INSERT teachers OFF'
@@ -0,0 +1,23 @@
+import os
+
+from sqlalchemy import inspect
+
+from loaders.models import Student, Teacher
+from loaders.schema import SchemaManager
+from loaders.targets import sqlite_engine
+
+
+def test_sync_recreates_tables_dropped_since_the_cached_reflection(tmp_path):
+    path, cache = str(tmp_path / 'target.db'), str(tmp_path / 'schema.json')
+    tables = [Teacher.__table__, Student.__table__]
+    engine = sqlite_engine(path)
+    SchemaManager(engine, cache).sync(tables)
+    # A second run reflects from the cache, which now lists both tables
+    SchemaManager(engine, cache).catalogue()
+    engine.dispose()
+    os.remove(path)
+
+    applied = SchemaManager(engine, cache).sync(tables)
+    assert [change.kind for change in applied] == ['create table', 'create table']
+    assert {'teachers', 'students'} <= set(inspect(engine).get_table_names())
+    engine.dispose()